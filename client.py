@@ -0,0 +1,110 @@
+#!/usr/bin/python
+import os
+import sys
+import json
+import struct
+import socket
+
+
+# Script info
+# Thin client for "test.py --serve". Forwards its command line to the
+# server and prints the streamed output. If no server is running, the
+# command line is run by test.py directly.
+SCRIPTUSAGE = "usage: client.py [--socket FILE] --option1 arg1 arg2 --option2 arg"
+LAUNCHERFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test.py')
+
+
+# Same socket location and message format as in test.py
+def socket_directory():
+    runtimeDir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtimeDir and os.path.isdir(runtimeDir):
+        return runtimeDir
+    return '/tmp/python-tests-launcher-' + str(os.getuid())
+
+SOCKETFILE = os.path.join(socket_directory(), 'python-tests-launcher.sock')
+MESSAGEHEADER = struct.Struct('!ci')
+
+
+# Return True if the socket and its directory belong to the user, and nobody
+# else can replace the socket. Otherwise the command line could end up at a
+# server of another user.
+def socket_trusted(socketFile):
+    try:
+        socketStat = os.lstat(socketFile)
+        directoryStat = os.lstat(os.path.dirname(os.path.abspath(socketFile)))
+    except OSError:
+        return False
+    return socketStat.st_uid == os.getuid() and directoryStat.st_uid == os.getuid() and directoryStat.st_mode & 0o022 == 0
+
+
+# Receive exactly size bytes, return None if the connection has been closed
+def receive(connection, size):
+    data = b''
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+# Send command line to server, write output messages to stdout
+# Returns the exit status of the command line
+def forward(connection, argv):
+    request = {'argv': argv, 'cwd': os.getcwd()}
+    connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    while True:
+        header = receive(connection, MESSAGEHEADER.size)
+        if header is None:
+            sys.stderr.write('Connection to server lost\n')
+            return 1
+        messageType, value = MESSAGEHEADER.unpack(header)
+        if messageType == b'x':
+            return value
+        data = receive(connection, value)
+        if data is None:
+            sys.stderr.write('Connection to server lost\n')
+            return 1
+        out.write(data)
+        out.flush()
+
+
+def main():
+    argv = sys.argv[1:]
+    socketFile = SOCKETFILE
+    if len(argv) >= 2 and argv[0] == '--socket':
+        socketFile = argv[1]
+        argv = argv[2:]
+
+    # Only fall back to the launcher if there is no server to connect to,
+    # once the command line has been sent it must not run a second time
+    connection = None
+    if socket_trusted(socketFile):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(socketFile)
+        except socket.error:
+            connection.close()
+            connection = None
+    elif os.path.lexists(socketFile):
+        sys.stderr.write('Ignoring socket ' + socketFile + ', it could have been replaced by another user\n')
+    if connection is None:
+        os.execv(sys.executable, [sys.executable, LAUNCHERFILE] + argv)
+
+    try:
+        status = forward(connection, argv)
+    except socket.error as e:
+        sys.stderr.write('Connection to server lost: ' + str(e) + '\n')
+        status = 1
+    finally:
+        connection.close()
+    sys.exit(status)
+
+
+# Kick off the shit...
+if __name__=='__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -1,14 +1,86 @@
+import os
+import json
+import zlib
 import pkgutil
+import importlib
 
 # Modules to exclude
 excludedModules = []
 excludedModules.append('maths')
 #excludedModules.append('timetrack')
 
-# Build list of all modules in package
+# Static manifest with option specs, names and info strings of all modules
+PACKAGEPATH = os.path.dirname(os.path.abspath(__file__))
+MANIFESTFILE = os.path.join(PACKAGEPATH, 'manifest.json')
+
+# Generated manifest cache, entries are stamped with module file size and checksum
+MANIFESTCACHEFILE = os.path.join(PACKAGEPATH, 'manifest.cache.json')
+
+# Build list of all modules in package. Modules are not imported here,
+# use load_module() to import a module when it's actually needed.
 __all__ = []
-for loader, module_name, is_pkg in  pkgutil.walk_packages(__path__):
+moduleFiles = {}
+for loader, module_name, is_pkg in pkgutil.iter_modules(__path__):
     if module_name not in excludedModules:
         __all__.append(module_name)
-        _module = loader.find_module(module_name).load_module(module_name)
-        globals()[module_name] = _module
+        if is_pkg:
+            moduleFiles[module_name] = os.path.join(PACKAGEPATH, module_name, '__init__.py')
+        else:
+            moduleFiles[module_name] = os.path.join(PACKAGEPATH, module_name + '.py')
+
+
+# Import a module from the package
+def load_module(module_name):
+    module = importlib.import_module(__name__ + '.' + module_name)
+    globals()[module_name] = module
+    return module
+
+
+# Option group stand-in that only records the options a module adds
+class OptionRecorder:
+    def __init__(self):
+        self.options = []
+
+    def add_option(self, *args, **kwargs):
+        self.options.append({'args': list(args), 'kwargs': kwargs})
+
+
+# Build a manifest entry for an imported module
+def build_manifest_entry(module):
+    recorder = OptionRecorder()
+    module.setup_args(recorder)
+    return {'name': module.get_name(), 'info': module.get_info(), 'options': recorder.options}
+
+
+# Return [size, crc32] of a module's file, used to invalidate manifest entries
+# Unlike the mtime, the checksum stays the same after a fresh checkout.
+def module_stamp(module_name):
+    try:
+        with open(moduleFiles[module_name], 'rb') as moduleFile:
+            content = moduleFile.read()
+    except (KeyError, IOError, OSError):
+        return None
+    return [len(content), zlib.crc32(content) & 0xffffffff]
+
+
+# Return True if the manifest cache can be written
+def manifest_cache_writable():
+    if os.path.exists(MANIFESTCACHEFILE):
+        return os.access(MANIFESTCACHEFILE, os.W_OK)
+    return os.access(PACKAGEPATH, os.W_OK)
+
+
+# Load manifest from disk, return empty manifest if there is none
+def load_manifest(filename=MANIFESTFILE):
+    try:
+        with open(filename, 'r') as manifestFile:
+            return json.load(manifestFile)
+    except (IOError, ValueError):
+        return {}
+
+
+# Write manifest to disk
+def write_manifest(manifest, filename=MANIFESTFILE):
+    with open(filename, 'w') as manifestFile:
+        manifestFile.write(json.dumps(manifest, indent=4, sort_keys=True, separators=(',', ': ')))
+        manifestFile.write('\n')
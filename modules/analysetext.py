@@ -523,6 +523,7 @@ def analyze_text(log, text):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -596,3 +597,5 @@ def run(log, options, args):
         jsonFilename = pre + '.json'
         log.info('Writing metadata to: ' + jsonFilename)
         write_results(results, jsonFilename, log)
+
+    return results
@@ -126,6 +126,7 @@ def calculate_price(log, width, height, factor):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -194,5 +195,8 @@ def run(log, options, args):
     # Here we go
     log.info('Calculating sales price for artwork of size ' + sizeStr + ' with factor ' + str(artFactor))
     print('')
-    log.info('Sell the artwork for ' + str(calculate_price(log, artWidth, artHeight, artFactor)) + ' EUR')
+    price = calculate_price(log, artWidth, artHeight, artFactor)
+    log.info('Sell the artwork for ' + str(price) + ' EUR')
     print('')
+
+    return {'width': artWidth, 'height': artHeight, 'factor': artFactor, 'price': price}
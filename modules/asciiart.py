@@ -128,6 +128,7 @@ def WriteOutputFile(filename, ascii, log):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -180,5 +181,8 @@ def run(log, options, args):
         if outputFile is not None and outputFile != '':
             log.info('Writing ASCII output to ' + outputFile)
             WriteOutputFile(outputFile, resultImage, log)
+
+        return {'ascii': resultImage}
     else:
         log.error('Could not create ASCII art from ' + fileName)
+        return None
@@ -1,9 +1,42 @@
 #!/usr/bin/python
+import os
 import sys
+import csv
+import json
 import time
+import socket
+import platform
+import subprocess
 import random
 import math
+import array
+import gc
+import io
+import mmap
+import shutil
+import tempfile
+import threading
 import multiprocessing as mp
+import multiprocessing.pool
+
+# Optional: concurrent.futures is only available in Python 3, or in Python 2
+# with the "futures" backport library (sudo pip install futures)
+try:
+    import concurrent.futures
+except ImportError:
+    concurrent = None
+
+# Optional: NumPy for the vectorized stages (sudo pip install numpy)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Python 2/3 compatibility, workers shouldn't allocate lists for their loops
+try:
+    range = xrange
+except NameError:
+    pass
 
 
 # Script info
@@ -12,7 +45,8 @@ SCRIPTVERSION = '0.3.2'
 SCRIPTINFO = 'Yield the full power of your machine and perform some multithreaded benchmarks!'
 SCRIPT_HELP = """
 Usage:
-  --benchmarks [tests=n] [threads=n] [timelimit=n] [intensity=n] [help]
+  --benchmarks [tests=n] [threads=n] [timelimit=n] [intensity=n] [executor=n] [arraysize=n] [matrixsize=n] [blocksize=n] [memsize=n] [heapsize=n] [diskdir=DIR] [filesize=n] [affinity=n] [scaling] [nohistory] [format=n] [out=FILE] [help]
+  --benchmarks compare [baseline=REV] [threshold=n]
 
 Examples:
   --benchmarks
@@ -24,8 +58,51 @@ Examples:
   --benchmarks intensity=100000
       Perform all benchmarks with very high intensity
 
+  --benchmarks tests=numpy matrixsize=512
+      Perform only the vectorized NumPy benchmarks, with 512x512 matrices
+
+  --benchmarks tests=matrix matrixsize=512 blocksize=64
+      Perform matrix benchmarks with 512x512 matrices, blocked in 64x64 tiles
+
+  --benchmarks tests=memory,alloc memsize=256
+      Measure memory bandwidth with 256 MB buffers, allocation rate and GC pauses
+
+  --benchmarks tests=disk diskdir=/mnt/data filesize=256
+      Measure storage throughput and fsync latency of /mnt/data with 256 MB files
+
+  --benchmarks scaling affinity=scatter
+      Measure scaling with workers pinned to cores, spread over all sockets
+
+  --benchmarks scaling tests=sin,float
+      Measure how sine and float benchmarks scale from 1 to all threads
+
+  --benchmarks executor=process,thread tests=sin
+      Compare sine benchmark throughput of process and thread pools
+
+  --benchmarks scaling format=csv out=results.csv
+      Measure scaling and export one record per stage and thread count to a CSV file
+
+  --benchmarks compare baseline=1a2b3c4
+      Compare the latest run with all earlier runs at git revision 1a2b3c4
+
 tests
     A comma separated list with the tests that should be performed.
+    The random, sin, float and matrix tests also run a vectorized NumPy
+    variant of their stage, if NumPy is installed. Use tests=numpy to
+    perform only the NumPy stages.
+    The memory test measures sequential read, sequential copy and random
+    4 KB copy bandwidth. The alloc test measures how many small dicts,
+    lists and tuples can be allocated with and without garbage collector,
+    and how long full garbage collections of a long-lived heap take.
+    Their buffers and heaps are kept by every worker until the benchmarks
+    end, so memory and alloc aren't part of all.
+    The disk test measures buffered and synced sequential writes, cached
+    and uncached sequential reads, random 4 KB reads, mmap reads and fsync
+    latency. It writes files, so it isn't part of all either. Uncached
+    reads drop the file from the page cache with os.posix_fadvise, which
+    Python 2 doesn't have, so run the launcher with Python 3.3+ (python3
+    test.py) to include them. All workers finish writing their files
+    before the first one starts measuring.
 
 threads
     Specify maximum number of threads for benchmarks. Default is the number of physical CPUs in your machine.
@@ -35,6 +112,86 @@ timelimit
 
 intensity
     Specify an optional intensity for the benchmarks. Default is 1000.
+    This is the number of operations per batch. Workers only check the
+    time limit after each batch.
+
+arraysize
+    Number of array elements per vectorized call in the NumPy stages.
+    Default is 100000.
+
+matrixsize
+    Size N of the NxN matrices multiplied in the blocked and NumPy matrix
+    stages. These stages report GFLOP/s (2*N^3 floating point operations
+    per multiplication). Default is 256.
+
+blocksize
+    Size of the square tiles of the cache-blocked matrix stage. Tiles of
+    the three matrices should fit into the CPU cache. Default is 32.
+
+memsize
+    Size in MB of the buffers of the memory bandwidth stages. Each worker
+    allocates two buffers of this size, they should be much larger than
+    the CPU caches. Default is 64.
+
+heapsize
+    Number of long-lived objects each worker keeps on its heap during the
+    alloc stages. Full garbage collections have to traverse all of them.
+    Default is 200000.
+
+diskdir
+    Directory the disk stages write their files to. Default is the system's
+    temporary directory. The files are removed after the benchmarks.
+
+filesize
+    Size in MB of the file each worker writes and reads in the disk stages.
+    Default is 64.
+
+executor
+    A comma separated list of executors that run the benchmark workers.
+    Possible values: process, thread, futures-process, futures-thread,
+    freethread. Default is process. With more than one executor, the
+    benchmarks are run for each of them and compared at the end.
+
+affinity
+    Pin workers to CPUs, so they don't migrate between cores and sockets
+    and results are reproducible. Needs os.sched_setaffinity, so run the
+    launcher with Python 3.3+ on Linux (python3 test.py). Possible values:
+      none       Don't pin workers (default)
+      compact    Pin worker n to the n-th CPU, filling up core after core
+                 (SMT siblings first) and socket after socket
+      scatter    Spread workers over sockets, and over physical cores
+                 before using SMT siblings
+      per-socket Pin workers to all CPUs of one socket, round robin
+    Comparing compact and scatter shows the cross-socket penalty.
+
+scaling
+    Run each test with 1, 2, 4, ... up to the maximum number of threads, and
+    report throughput, speedup and parallel efficiency per step. Also finds
+    the knee, after which adding threads adds less than half of a single
+    thread's throughput (e.g. because of SMT or memory bandwidth limits).
+
+nohistory
+    Don't append the results to the benchmark history file.
+
+format
+    Format of the exported results: json or csv. Default is json.
+    Needs out=FILE.
+
+out
+    Export results to a file, with one record per executor, stage and
+    thread count. Records include operations, duration, throughput,
+    speedup, batch latency percentiles, settings and host information.
+
+compare
+    Don't run benchmarks, but compare the latest run in the history file with
+    earlier runs on the same host, and flag statistically significant slowdowns.
+
+baseline
+    Only use history runs whose git revision starts with REV as baseline.
+    Default is all earlier runs on the same host.
+
+threshold
+    Minimum slowdown in percent to be reported. Default is 5.
 
 help
     Displays this help, so you propably already know this one.
@@ -42,11 +199,11 @@ help
 
 
 # Generate MP speedup message
-def speedup_msg(countSingle, countMulti):
-    if countSingle == 0:
+def speedup_msg(rateSingle, rateMulti):
+    if rateSingle == 0:
         return 'MP speedup: [INFINITE]'
 
-    speedupVal = float(countMulti) / float(countSingle)
+    speedupVal = float(rateMulti) / float(rateSingle)
     if speedupVal <= 1.0:
         assessment = "performance *LOSS*"
     else:
@@ -54,305 +211,925 @@ def speedup_msg(countSingle, countMulti):
     return 'MP speedup: ' + "%1.4f" % (speedupVal) + 'x ' + assessment
 
 
+#####################################
+#
+# Workers
+#
+#####################################
+#
+# Kernel functions perform one batch of operations and return the number of
+# operations performed. They run in the processes of the benchmark pool,
+# where run_stage_descriptor() calls them until the time limit is reached.
+# The clock is only read once per batch, so it doesn't dominate the measured
+# time. Scalar kernels perform testIntensity operations per batch, settings
+# is a dictionary with the stage settings (arraysize, matrixsize).
+
 # Benchmark integer counting performance
-def test_count(log, threadCount, timeLimit, testIntensity=100):
-    def workerCount(timeLimit, count):
-        startTime = time.time()
-        i = 1
-        keepRunning = True
-        while keepRunning:
-            for n in range(testIntensity):
-                i += 1
-                if time.time() - startTime >= timeLimit.value:
-                    keepRunning = False
-                    break
-        count.value += i
-
-
-    log.info('Count test: 1 thread...')
-    timeLimitVal = mp.Value('d', timeLimit)
-    count = mp.Value('i', 0)
-    proc = mp.Process(target=workerCount, args=(timeLimitVal, count))
-    proc.start()
-    proc.join()
-    singleCount = count.value
-    log.info('Counted ' + "{:,}".format(singleCount) + ' values in ' + str(timeLimit) + ' seconds')
+def kernel_count(testIntensity, settings):
+    i = 1
+    for n in range(testIntensity):
+        i += 1
+    return testIntensity
 
-    if threadCount <= 1:
-        return
 
-    log.info('Count test: ' + str(threadCount) + ' threads...')
-    processes = []
-    values = []
-    multiCount = 0
-    for t in range(threadCount):
-        count = mp.Value('i', 0)
-        values.append(count)
-        proc = mp.Process(target=workerCount, args=(timeLimitVal, count))
-        processes.append(proc)
+# Benchmark random() performance
+def kernel_random(testIntensity, settings):
+    for n in range(testIntensity):
+        x = random.random()
+    return testIntensity
 
-    # Start all
-    for proc in processes:
-        proc.start()
-        log.debug('Started process ' + str(proc.pid))
 
-    # End all
-    for i, proc in enumerate(processes):
-        proc.join()
-        val = values[i].value
-        multiCount += val
-        log.debug('Process ' + str(proc.pid) + ' calculated ' + str(val) + ' values')
+# Benchmark float division performance
+def kernel_float(testIntensity, settings):
+    i = 1
+    for n in range(testIntensity):
+        y = math.pi / float(i)
+        i += 1
+    return testIntensity
 
-    log.info('Counted ' + "{:,}".format(multiCount) + ' values in ' + str(timeLimit) + ' seconds (' + "{:,}".format(multiCount / threadCount) + ' per thread)')
-    log.info(speedup_msg(singleCount, multiCount))
 
+# Benchmark sin() performance
+def kernel_sin(testIntensity, settings):
+    x = 1.234567
+    for n in range(testIntensity):
+        x = math.sin(x)
+    return testIntensity
 
-# Benchmark random() performance
-def test_random(log, threadCount, timeLimit, testIntensity=100):
-    def workerRandom(timeLimit, count):
-        startTime = time.time()
-        i = 1
-        keepRunning = True
-        while keepRunning:
-            for n in range(testIntensity):
-                x = random.random()
-                i += 1
-                if time.time() - startTime >= timeLimit.value:
-                    keepRunning = False
-                    break
-        count.value += i
-
-
-    log.info('Random test: 1 thread...')
-    timeLimitVal = mp.Value('d', timeLimit)
-    count = mp.Value('i', 0)
-    proc = mp.Process(target=workerRandom, args=(timeLimitVal, count))
-    proc.start()
-    proc.join()
-    singleCount = count.value
-    log.info('Calculated ' + "{:,}".format(singleCount) + ' random numbers in ' + str(timeLimit) + ' seconds')
 
-    if threadCount <= 1:
-        return
+# Matrices for matrix multiplication benchmark
+matrixX = [[1.2, 2.3, 3.4], [4.5, 5.6, 6.7], [7.8, 8.9, 9.1], [10.2, 11.3, 12.4]]
+matrixY = [[1.9, 2.8, 7.6], [1.7, 2.6, 4.2], [3.5, 4.4, 7.3], [15.1, 52.2, 73.2]]
 
-    log.info('Random test: ' + str(threadCount) + ' threads...')
-    processes = []
-    values = []
-    multiCount = 0
-    for t in range(threadCount):
-        count = mp.Value('i', 0)
-        values.append(count)
-        proc = mp.Process(target=workerRandom, args=(timeLimitVal, count))
-        processes.append(proc)
+def matmult(a, b):
+    zip_b = zip(*b)
+    # Python 3's zip is an iterator, which would be consumed after the first row
+    zip_b = list(zip_b)
+    return [[sum(ele_a * ele_b for ele_a, ele_b in zip(row_a, col_b)) 
+             for col_b in zip_b] for row_a in a]
 
-    # Start all
-    for proc in processes:
-        proc.start()
-        log.debug('Started process ' + str(proc.pid))
 
-    # End all
-    for i, proc in enumerate(processes):
-        proc.join()
-        val = values[i].value
-        multiCount += val
-        log.debug('Process ' + str(proc.pid) + ' calculated ' + str(val) + ' values')
+# Benchmark matrix multiplication performance
+def kernel_matrix(testIntensity, settings):
+    for n in range(testIntensity):
+        mRes = matmult(matrixX, matrixY)
+    return testIntensity
 
-    log.info('Calculated ' + "{:,}".format(multiCount) + ' random numbers in ' + str(timeLimit) + ' seconds (' + "{:,}".format(multiCount / threadCount) + ' per thread)')
-    log.info(speedup_msg(singleCount, multiCount))
 
+# State of the blocked matrix multiplication in a worker process:
+# settings, matrices and the next block row to calculate
+blockedMatrix = {}
 
-# Benchmark integer counting performance
-def test_float(log, threadCount, timeLimit, testIntensity=100):
-    def workerFloat(timeLimit, count):
-        startTime = time.time()
-        i = 1
-        keepRunning = True
-        while keepRunning:
-            for n in range(testIntensity):
-                y = math.pi / float(i)
-                i += 1
-                if time.time() - startTime >= timeLimit.value:
-                    keepRunning = False
-                    break
-        count.value += i
-
-
-    log.info('Float test: 1 thread...')
-    timeLimitVal = mp.Value('d', timeLimit)
-    count = mp.Value('i', 0)
-    proc = mp.Process(target=workerFloat, args=(timeLimitVal, count))
-    proc.start()
-    proc.join()
-    singleCount = count.value
-    log.info('Divided ' + "{:,}".format(singleCount) + ' float values in ' + str(timeLimit) + ' seconds')
-
-    if threadCount <= 1:
+# Create NxN matrices A, B and result C, each row an array of doubles.
+# Workers of a thread pool share the matrices, so they're only created once.
+def blocked_matrix_setup(settings):
+    if blockedMatrix.get('settings') == settings:
         return
+    size = settings['matrixsize']
+    rng = random.Random(size)
+    blockedMatrix['settings'] = settings
+    blockedMatrix['a'] = [array.array('d', [rng.random() for j in range(size)]) for i in range(size)]
+    blockedMatrix['b'] = [array.array('d', [rng.random() for j in range(size)]) for i in range(size)]
+    blockedMatrix['c'] = [array.array('d', [0.0] * size) for i in range(size)]
+    blockedMatrix['row'] = 0
+
+
+# Calculate rows rowStart..rowEnd of C = A * B tile by tile, so the tiles of
+# B are reused from cache for all rows of the block, instead of streaming
+# the whole matrix B through the cache for each row
+def blocked_matmult_rows(a, b, c, size, blockSize, rowStart, rowEnd):
+    for i in range(rowStart, rowEnd):
+        rowC = c[i]
+        for j in range(size):
+            rowC[j] = 0.0
+    for kStart in range(0, size, blockSize):
+        kEnd = min(kStart + blockSize, size)
+        for jStart in range(0, size, blockSize):
+            jEnd = min(jStart + blockSize, size)
+            for i in range(rowStart, rowEnd):
+                rowA = a[i]
+                rowC = c[i]
+                for k in range(kStart, kEnd):
+                    aik = rowA[k]
+                    rowB = b[k]
+                    for j in range(jStart, jEnd):
+                        rowC[j] += aik * rowB[j]
+
+
+# Benchmark cache-blocked matrix multiplication, one block row of C per batch.
+# Returns floating point operations, a multiplication of NxN matrices takes 2*N^3.
+def kernel_matrix_blocked(testIntensity, settings):
+    size = settings['matrixsize']
+    blockSize = min(settings['blocksize'], size)
+    rowStart = blockedMatrix['row']
+    rowEnd = min(rowStart + blockSize, size)
+    blocked_matmult_rows(blockedMatrix['a'], blockedMatrix['b'], blockedMatrix['c'], size, blockSize, rowStart, rowEnd)
+    blockedMatrix['row'] = rowEnd % size
+    return 2 * (rowEnd - rowStart) * size * size
+
+
+# Input and output arrays of the NumPy kernels, allocated once per worker
+# process, so batches don't measure memory allocation
+numpyArrays = {}
+
+def numpy_array(name, shape):
+    key = (name, shape)
+    if key not in numpyArrays:
+        if name == 'out':
+            numpyArrays[key] = np.empty(shape)
+        else:
+            numpyArrays[key] = np.random.random(shape) + 1.0
+    return numpyArrays[key]
 
-    log.info('Float test: ' + str(threadCount) + ' threads...')
-    processes = []
-    values = []
-    multiCount = 0
-    for t in range(threadCount):
-        count = mp.Value('i', 0)
-        values.append(count)
-        proc = mp.Process(target=workerFloat, args=(timeLimitVal, count))
-        processes.append(proc)
 
-    # Start all
-    for proc in processes:
-        proc.start()
-        log.debug('Started process ' + str(proc.pid))
+# Benchmark vectorized random number generation, one call per batch
+def kernel_numpy_random(testIntensity, settings):
+    size = settings['arraysize']
+    x = np.random.random(size)
+    return size
 
-    # End all
-    for i, proc in enumerate(processes):
-        proc.join()
-        val = values[i].value
-        multiCount += val
-        log.debug('Process ' + str(proc.pid) + ' calculated ' + str(val) + ' values')
 
-    log.info('Divided ' + "{:,}".format(multiCount) + ' float values in ' + str(timeLimit) + ' seconds (' + "{:,}".format(multiCount / threadCount) + ' per thread)')
-    log.info(speedup_msg(singleCount, multiCount))
+# Benchmark vectorized float division, one call per batch
+def kernel_numpy_float(testIntensity, settings):
+    size = settings['arraysize']
+    np.divide(math.pi, numpy_array('in', size), out=numpy_array('out', size))
+    return size
 
 
-# Benchmark sin() performance
-def test_sin(log, threadCount, timeLimit, testIntensity=100):
-    def workerSin(timeLimit, count):
-        startTime = time.time()
-        i = 1
-        keepRunning = True
-        while keepRunning:
-            x = 1.234567
-            for n in range(testIntensity):
-                x = math.sin(x)
-                i += 1
-                if time.time() - startTime >= timeLimit.value:
-                    keepRunning = False
-                    break
-        count.value += i
-
-
-    log.info('Sin() test: 1 thread...')
-    timeLimitVal = mp.Value('d', timeLimit)
-    count = mp.Value('i', 0)
-    proc = mp.Process(target=workerSin, args=(timeLimitVal, count))
-    proc.start()
-    proc.join()
-    singleCount = count.value
-    log.info('Calculated ' + "{:,}".format(singleCount) + ' sine values in ' + str(timeLimit) + ' seconds')
+# Benchmark vectorized sin(), one call per batch
+def kernel_numpy_sin(testIntensity, settings):
+    size = settings['arraysize']
+    np.sin(numpy_array('in', size), out=numpy_array('out', size))
+    return size
 
-    if threadCount <= 1:
-        return
 
-    log.info('Sin() test: ' + str(threadCount) + ' threads...')
-    processes = []
-    values = []
-    multiCount = 0
-    for t in range(threadCount):
-        count = mp.Value('i', 0)
-        values.append(count)
-        proc = mp.Process(target=workerSin, args=(timeLimitVal, count))
-        processes.append(proc)
+# Benchmark NumPy (BLAS) matrix multiplication, one NxN multiplication per batch
+# Returns floating point operations, a multiplication of NxN matrices takes 2*N^3.
+def kernel_numpy_matrix(testIntensity, settings):
+    size = settings['matrixsize']
+    shape = (size, size)
+    np.dot(numpy_array('a', shape), numpy_array('b', shape), out=numpy_array('out', shape))
+    return 2 * size * size * size
 
-    # Start all
-    for proc in processes:
-        proc.start()
-        log.debug('Started process ' + str(proc.pid))
 
-    # End all
-    for i, proc in enumerate(processes):
-        proc.join()
-        val = values[i].value
-        multiCount += val
-        log.debug('Process ' + str(proc.pid) + ' calculated ' + str(val) + ' values')
+# Buffers of the memory bandwidth stages, created once per worker process
+MEMORY_CHUNKSIZE = 4096
+memoryBuffers = {}
 
-    log.info('Calculated ' + "{:,}".format(multiCount) + ' sine values in ' + str(timeLimit) + ' seconds (' + "{:,}".format(multiCount / threadCount) + ' per thread)')
-    log.info(speedup_msg(singleCount, multiCount))
+def memory_buffers_setup(settings):
+    if memoryBuffers.get('settings') == settings:
+        return
+    size = settings['memsize'] * 1024 * 1024
+    chunkCount = size // MEMORY_CHUNKSIZE
+    rng = random.Random(size)
+    memoryBuffers['settings'] = settings
+    memoryBuffers['source'] = bytearray(size)
+    memoryBuffers['target'] = bytearray(size)
+    memoryBuffers['offsets'] = [rng.randrange(chunkCount) * MEMORY_CHUNKSIZE for n in range(4096)]
+    # Touch all pages of the target buffer, so page faults aren't measured.
+    # Both buffers stay equal, all stages only copy zeros from source to target.
+    memoryBuffers['target'][:] = memoryBuffers['source']
+
+
+# Benchmark sequential memory read bandwidth, one pass over both buffers per batch.
+# Comparing the equal buffers reads them with memcmp() at memory speed.
+def kernel_memory_read(testIntensity, settings):
+    source = memoryBuffers['source']
+    equal = source == memoryBuffers['target']
+    return 2 * len(source)
+
+
+# Benchmark sequential memory copy bandwidth, one copy of the buffer per batch
+def kernel_memory_copy(testIntensity, settings):
+    memoryview(memoryBuffers['target'])[:] = memoryview(memoryBuffers['source'])
+    return len(memoryBuffers['source'])
+
+
+# Benchmark random memory copy bandwidth, testIntensity 4 KB chunks per batch
+def kernel_memory_random(testIntensity, settings):
+    source = memoryview(memoryBuffers['source'])
+    target = memoryview(memoryBuffers['target'])
+    offsets = memoryBuffers['offsets']
+    offsetCount = len(offsets)
+    for n in range(testIntensity):
+        sourceOffset = offsets[n % offsetCount]
+        targetOffset = offsets[(n + 1) % offsetCount]
+        target[targetOffset:targetOffset + MEMORY_CHUNKSIZE] = source[sourceOffset:sourceOffset + MEMORY_CHUNKSIZE]
+    return testIntensity * MEMORY_CHUNKSIZE
+
+
+# Long-lived heap of the alloc stages, like the indexes of text processing jobs
+gcHeap = {}
+
+def gc_heap_setup(settings):
+    if gcHeap.get('settings') == settings:
+        return
+    gcHeap['settings'] = settings
+    gcHeap['objects'] = [{'id': n, 'words': [n, n + 1]} for n in range(settings['heapsize'])]
+    gc.collect()
+
+
+# Allocate testIntensity small dicts, lists and tuples, which are kept until
+# the end of the batch, so the garbage collector is triggered regularly
+def allocate_objects(testIntensity):
+    objects = []
+    for n in range(testIntensity):
+        word = {'id': n, 'count': 1}
+        positions = [n, n + 1]
+        objects.append((word, positions))
+    return 3 * testIntensity
+
+
+# Benchmark allocation rate with enabled garbage collector
+def kernel_alloc(testIntensity, settings):
+    return allocate_objects(testIntensity)
+
+
+# Benchmark allocation rate with disabled garbage collector
+# The GC switch is global, so in thread pools the workers may re-enable it for each other
+def kernel_alloc_nogc(testIntensity, settings):
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        return allocate_objects(testIntensity)
+    finally:
+        if gcEnabled:
+            gc.enable()
+
+
+# Benchmark full garbage collections of the long-lived heap, one per batch
+def kernel_gc(testIntensity, settings):
+    gc.collect()
+    return 1
+
+
+# Files of the disk stages, one per worker process or thread, keyed by
+# (process id, thread id), as the workers of thread pools share this dictionary
+DISK_CHUNKSIZE = 1024 * 1024
+DISK_BLOCKSIZE = 4096
+diskFiles = {}
+
+def disk_file_setup(settings):
+    key = (os.getpid(), threading.current_thread().ident)
+    if key in diskFiles and diskFiles[key]['settings'] == settings:
+        return
+    size = settings['filesize'] * 1024 * 1024
+    rng = random.Random(size)
+    # Random data, so compressing file systems can't cheat
+    chunk = os.urandom(DISK_CHUNKSIZE)
+    path = os.path.join(settings['diskdir'], 'worker-' + str(key[0]) + '-' + str(key[1]))
+    diskFiles[key] = {'settings': settings,
+                      'path': path,
+                      'size': size,
+                      'chunk': chunk,
+                      'buffer': bytearray(DISK_CHUNKSIZE),
+                      'offsets': [rng.randrange(size // DISK_BLOCKSIZE) * DISK_BLOCKSIZE for n in range(4096)]}
+    write_disk_file(diskFiles[key], True)
+
+
+# Return the disk file state of the calling worker
+def worker_disk_file():
+    return diskFiles[(os.getpid(), threading.current_thread().ident)]
+
+
+# Write the whole file sequentially, synced to the device or only to the page cache
+def write_disk_file(diskFile, sync):
+    if sync:
+        fd = os.open(diskFile['path'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            for offset in range(0, diskFile['size'], DISK_CHUNKSIZE):
+                os.write(fd, diskFile['chunk'])
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    else:
+        with io.open(diskFile['path'], 'wb') as outFile:
+            for offset in range(0, diskFile['size'], DISK_CHUNKSIZE):
+                outFile.write(diskFile['chunk'])
+    return diskFile['size']
+
+
+# Read the whole file sequentially into the worker's buffer
+def read_disk_file(diskFile):
+    buffer = diskFile['buffer']
+    with io.open(diskFile['path'], 'rb') as inFile:
+        while inFile.readinto(buffer) > 0:
+            pass
+    return diskFile['size']
+
+
+# Benchmark buffered sequential writes (page cache), one pass over the file per batch
+def kernel_disk_write(testIntensity, settings):
+    return write_disk_file(worker_disk_file(), False)
+
+
+# Benchmark unbuffered sequential writes synced to the device, one pass over the file per batch
+def kernel_disk_write_sync(testIntensity, settings):
+    return write_disk_file(worker_disk_file(), True)
+
+
+# Benchmark buffered sequential reads, one pass over the file per batch.
+# The file was just written, so this usually measures the page cache.
+def kernel_disk_read(testIntensity, settings):
+    return read_disk_file(worker_disk_file())
+
+
+# Benchmark uncached sequential reads, one pass over the file per batch.
+# Drops the file from the page cache first, so it has to be read from the device.
+def kernel_disk_read_uncached(testIntensity, settings):
+    diskFile = worker_disk_file()
+    fd = os.open(diskFile['path'], os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return read_disk_file(diskFile)
+
+
+# Benchmark random 4 KB reads, testIntensity reads per batch
+def kernel_disk_random(testIntensity, settings):
+    diskFile = worker_disk_file()
+    offsets = diskFile['offsets']
+    offsetCount = len(offsets)
+    fd = os.open(diskFile['path'], os.O_RDONLY)
+    try:
+        for n in range(testIntensity):
+            os.lseek(fd, offsets[n % offsetCount], os.SEEK_SET)
+            os.read(fd, DISK_BLOCKSIZE)
+    finally:
+        os.close(fd)
+    return testIntensity * DISK_BLOCKSIZE
+
+
+# Benchmark reads of the memory mapped file in 1 MB slices, one pass per batch
+def kernel_disk_mmap(testIntensity, settings):
+    diskFile = worker_disk_file()
+    fd = os.open(diskFile['path'], os.O_RDONLY)
+    try:
+        mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        try:
+            for offset in range(0, diskFile['size'], DISK_CHUNKSIZE):
+                data = mapped[offset:offset + DISK_CHUNKSIZE]
+        finally:
+            mapped.close()
+    finally:
+        os.close(fd)
+    return diskFile['size']
+
+
+# Benchmark fsync latency, one 4 KB write and fsync per batch
+def kernel_disk_fsync(testIntensity, settings):
+    diskFile = worker_disk_file()
+    fd = os.open(diskFile['path'], os.O_WRONLY)
+    try:
+        os.write(fd, diskFile['chunk'][:DISK_BLOCKSIZE])
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return 1
+
+
+# Test stages
+# Associates stage name to title, result message and kernel function.
+# Optional keys: 'requires' names an optional library or function the stage needs,
+# 'scalar' names the scalar stage a vectorized stage is compared with,
+# 'unit' is 'flop' or 'byte' if the kernel counts floating point operations
+# or bytes, 'call' if it counts slow calls whose latency is reported,
+# 'gcbaseline' names the stage an allocation stage without GC is compared with,
+# 'setup' is a function called with the settings before the time is measured.
+stages = {}
+stages['count'] = {'title': 'Count test', 'result': 'Counted {} values', 'kernel': kernel_count}
+stages['random'] = {'title': 'Random test', 'result': 'Calculated {} random numbers', 'kernel': kernel_random}
+stages['sin'] = {'title': 'Sin() test', 'result': 'Calculated {} sine values', 'kernel': kernel_sin}
+stages['float'] = {'title': 'Float test', 'result': 'Divided {} float values', 'kernel': kernel_float}
+stages['matrix'] = {'title': 'Matrix multiplication test', 'result': 'Multiplied {} matrices', 'kernel': kernel_matrix}
+stages['random-numpy'] = {'title': 'NumPy random test', 'result': 'Calculated {} random numbers', 'kernel': kernel_numpy_random, 'requires': 'numpy', 'scalar': 'random'}
+stages['sin-numpy'] = {'title': 'NumPy sin() test', 'result': 'Calculated {} sine values', 'kernel': kernel_numpy_sin, 'requires': 'numpy', 'scalar': 'sin'}
+stages['float-numpy'] = {'title': 'NumPy float test', 'result': 'Divided {} float values', 'kernel': kernel_numpy_float, 'requires': 'numpy', 'scalar': 'float'}
+stages['matrix-blocked'] = {'title': 'Blocked matrix multiplication test', 'result': 'Performed {} floating point operations', 'kernel': kernel_matrix_blocked, 'unit': 'flop', 'setup': blocked_matrix_setup}
+stages['matrix-numpy'] = {'title': 'NumPy matrix multiplication test', 'result': 'Performed {} floating point operations', 'kernel': kernel_numpy_matrix, 'requires': 'numpy', 'scalar': 'matrix-blocked', 'unit': 'flop'}
+stages['memory-read'] = {'title': 'Sequential memory read test', 'result': 'Read {} bytes', 'kernel': kernel_memory_read, 'unit': 'byte', 'setup': memory_buffers_setup}
+stages['memory-copy'] = {'title': 'Sequential memory copy test', 'result': 'Copied {} bytes', 'kernel': kernel_memory_copy, 'unit': 'byte', 'setup': memory_buffers_setup}
+stages['memory-random'] = {'title': 'Random memory copy test', 'result': 'Copied {} bytes in 4 KB chunks', 'kernel': kernel_memory_random, 'unit': 'byte', 'setup': memory_buffers_setup}
+stages['alloc-nogc'] = {'title': 'Allocation test without GC', 'result': 'Allocated {} objects', 'kernel': kernel_alloc_nogc, 'setup': gc_heap_setup}
+stages['alloc'] = {'title': 'Allocation test', 'result': 'Allocated {} objects', 'kernel': kernel_alloc, 'setup': gc_heap_setup, 'gcbaseline': 'alloc-nogc'}
+stages['gc'] = {'title': 'Garbage collection test', 'result': 'Performed {} full garbage collections', 'kernel': kernel_gc, 'unit': 'call', 'setup': gc_heap_setup}
+stages['disk-write'] = {'title': 'Buffered disk write test', 'result': 'Wrote {} bytes', 'kernel': kernel_disk_write, 'unit': 'byte', 'setup': disk_file_setup}
+stages['disk-write-sync'] = {'title': 'Synced disk write test', 'result': 'Wrote {} bytes', 'kernel': kernel_disk_write_sync, 'unit': 'byte', 'setup': disk_file_setup}
+stages['disk-read'] = {'title': 'Buffered disk read test', 'result': 'Read {} bytes', 'kernel': kernel_disk_read, 'unit': 'byte', 'setup': disk_file_setup}
+stages['disk-read-uncached'] = {'title': 'Uncached disk read test', 'result': 'Read {} bytes', 'kernel': kernel_disk_read_uncached, 'unit': 'byte', 'setup': disk_file_setup, 'requires': 'posix_fadvise'}
+stages['disk-random'] = {'title': 'Random disk read test', 'result': 'Read {} bytes in 4 KB blocks', 'kernel': kernel_disk_random, 'unit': 'byte', 'setup': disk_file_setup}
+stages['disk-mmap'] = {'title': 'Memory mapped disk read test', 'result': 'Read {} bytes', 'kernel': kernel_disk_mmap, 'unit': 'byte', 'setup': disk_file_setup}
+stages['disk-fsync'] = {'title': 'Fsync test', 'result': 'Performed {} writes with fsync', 'kernel': kernel_disk_fsync, 'unit': 'call', 'setup': disk_file_setup}
+
+
+# Return None if a stage can be run with this interpreter, otherwise the reason why not
+def stage_unavailable_reason(stageName):
+    if stages[stageName].get('requires') == 'numpy' and np is None:
+        return 'NumPy is not installed'
+    if stages[stageName].get('requires') == 'posix_fadvise' and not hasattr(os, 'posix_fadvise'):
+        return 'os.posix_fadvise is not available (needs Python 3.3+ on a POSIX system)'
+    return None
+
+
+# Number of sub-buckets per power of two in latency histograms, as in
+# HdrHistogram. Recorded values are accurate to 1/64 (1.6%).
+HISTOGRAM_SUBBUCKET_BITS = 7
+
+# Histogram of batch latencies in nanoseconds with logarithmic buckets,
+# each split into linear sub-buckets, so it stays small for any range of
+# values. Workers return their histogram, the launcher merges them.
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    # Values below 2^SUBBUCKET_BITS get their own bucket. Larger values are
+    # shifted, so that their SUBBUCKET_BITS most significant bits remain.
+    def bucket_index(self, value):
+        shift = max(value.bit_length() - HISTOGRAM_SUBBUCKET_BITS, 0)
+        return (shift << HISTOGRAM_SUBBUCKET_BITS) + (value >> shift)
+
+    # Return the highest value that falls into a bucket
+    def bucket_value(self, index):
+        shift = index >> HISTOGRAM_SUBBUCKET_BITS
+        subBucket = index & ((1 << HISTOGRAM_SUBBUCKET_BITS) - 1)
+        if shift == 0:
+            return subBucket
+        return ((subBucket + 1) << shift) - 1
+
+    # Record a latency in seconds
+    def record(self, seconds):
+        value = int(seconds * 1e9)
+        index = self.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # Add all values of another histogram
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    # Return the p-th percentile (0..100) in seconds
+    def percentile(self, p):
+        if self.total == 0:
+            return 0.0
+        rank = max(int(math.ceil(p / 100.0 * self.total)), 1)
+        seen = 0
+        for index in sorted(self.counts.keys()):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max) / 1e9
+        return self.max / 1e9
+
+    # Return count, mean, p50, p90, p99 and max in seconds
+    def summary(self):
+        return {'count': self.total,
+                'mean': self.sum / float(self.total) / 1e9 if self.total > 0 else 0.0,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'max': self.max / 1e9}
+
+
+# Run a stage descriptor (stageName, timeLimit, testIntensity, settings, cpus, gate) in a pool process
+# Pins the worker to cpus, unless it's None, and runs whole batches until the deadline
+# has passed. If there is a start gate, the clock is only started when all workers of
+# the measurement have finished their setup, so no worker measures against the setup
+# I/O of the others. Returns (operations, seconds, histogram) with the latency histogram of all batches.
+def run_stage_descriptor(descriptor):
+    stageName, timeLimit, testIntensity, settings, cpus, gate = descriptor
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    kernel = stages[stageName]['kernel']
+    if 'setup' in stages[stageName]:
+        try:
+            stages[stageName]['setup'](settings)
+        except:
+            if gate is not None:
+                gate.abort()
+            raise
+    if gate is not None:
+        gate.wait()
+    histogram = LatencyHistogram()
+    operations = 0
+    startTime = time.time()
+    deadline = startTime + timeLimit
+    batchStart = startTime
+    while True:
+        operations += kernel(testIntensity, settings)
+        now = time.time()
+        histogram.record(now - batchStart)
+        batchStart = now
+        if now >= deadline:
+            break
+    return operations, now - startTime, histogram
+
+
+# Return True if the interpreter runs with a GIL (always True before Python 3.13)
+def gil_enabled():
+    if hasattr(sys, '_is_gil_enabled'):
+        return sys._is_gil_enabled()
+    return True
 
 
-# Benchmark sin() performance
-def test_matrixmultiplication(log, threadCount, timeLimit, testIntensity=100):
-
-    matrixX = [[1.2, 2.3, 3.4], [4.5, 5.6, 6.7], [7.8, 8.9, 9.1], [10.2, 11.3, 12.4]]
-    matrixY = [[1.9, 2.8, 7.6], [1.7, 2.6, 4.2], [3.5, 4.4, 7.3], [15.1, 52.2, 73.2]]
-
-    def matmult(a, b):
-        zip_b = zip(*b)
-        # uncomment next line if python 3 : 
-        # zip_b = list(zip_b)
-        return [[sum(ele_a * ele_b for ele_a, ele_b in zip(row_a, col_b)) 
-                 for col_b in zip_b] for row_a in a]
-
-    def workerMatrixMultiplication(timeLimit, count):
-        startTime = time.time()
-        i = 1
-        keepRunning = True
-        while keepRunning:
-            for n in range(testIntensity):
-                mRes = matmult(matrixX, matrixY)
-                i += 1
-                if time.time() - startTime >= timeLimit.value:
-                    keepRunning = False
-                    break
-        count.value += i
-
-    # Create matrices
-    log.info('Preparing matrix multiplication test...')
-
-    log.info('Matrix multiplication test: 1 thread...')
-    timeLimitVal = mp.Value('d', timeLimit)
-    count = mp.Value('i', 0)
-    proc = mp.Process(target=workerMatrixMultiplication, args=(timeLimitVal, count))
-    proc.start()
-    proc.join()
-    singleCount = count.value
-    log.info('Multiplied ' + "{:,}".format(singleCount) + ' matrices in ' + str(timeLimit) + ' seconds')
+# Available executors for running stage descriptors
+# Associates executor name to description
+executors = {}
+executors['process'] = 'multiprocessing process pool'
+executors['thread'] = 'multiprocessing thread pool'
+executors['futures-process'] = 'concurrent.futures ProcessPoolExecutor'
+executors['futures-thread'] = 'concurrent.futures ThreadPoolExecutor'
+executors['freethread'] = 'thread pool on a free-threaded interpreter (no GIL)'
+
+
+# Return None if an executor can be used with this interpreter, otherwise the reason why not
+def executor_unavailable_reason(executorName):
+    if executorName.startswith('futures-') and concurrent is None:
+        return 'concurrent.futures is not available (Python 2 needs the "futures" library)'
+    if executorName == 'freethread' and gil_enabled():
+        return 'interpreter runs with a GIL (needs a free-threaded Python 3.13+ build)'
+    return None
+
+
+# Lets the workers of a measurement wait until all of them have arrived.
+# Built on manager proxies, as these can be passed to the workers of all
+# executors, while multiprocessing.Barrier only exists in Python 3.
+class StartGate:
+    def __init__(self, manager, parties):
+        self.parties = parties
+        self.condition = manager.Condition()
+        self.arrived = manager.Value('i', 0)
+        self.aborted = manager.Value('b', False)
+
+    # Wait until all parties have arrived, or the gate has been aborted
+    def wait(self):
+        self.condition.acquire()
+        try:
+            self.arrived.value += 1
+            if self.arrived.value >= self.parties:
+                self.condition.notify_all()
+            while self.arrived.value < self.parties and not self.aborted.value:
+                self.condition.wait(1.0)
+        finally:
+            self.condition.release()
+
+    # Release all waiting parties, e.g. if a worker's setup has failed
+    def abort(self):
+        self.condition.acquire()
+        try:
+            self.aborted.value = True
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+
+# Pool of workers that run stage descriptors, created once and shared by all stages
+class WorkerPool:
+    def __init__(self, executorName, workerCount):
+        self.executorName = executorName
+        self.manager = None
+        if executorName == 'process':
+            self.pool = mp.Pool(workerCount)
+        elif executorName in ('thread', 'freethread'):
+            self.pool = multiprocessing.pool.ThreadPool(workerCount)
+        elif executorName == 'futures-process':
+            self.pool = concurrent.futures.ProcessPoolExecutor(workerCount)
+        elif executorName == 'futures-thread':
+            self.pool = concurrent.futures.ThreadPoolExecutor(workerCount)
+        else:
+            raise ValueError('Unknown executor: ' + executorName)
+        self.isFutures = executorName.startswith('futures-')
+
+    # Return a StartGate for parties workers, the manager process is only started when needed
+    def start_gate(self, parties):
+        if self.manager is None:
+            self.manager = mp.Manager()
+        return StartGate(self.manager, parties)
+
+    # Map descriptors to workers, one descriptor per worker.
+    # Waiting with a timeout keeps multiprocessing pools interruptible by CTRL+C.
+    def map(self, descriptors):
+        if self.isFutures:
+            return list(self.pool.map(run_stage_descriptor, descriptors))
+        return self.pool.map_async(run_stage_descriptor, descriptors, chunksize=1).get(POOL_TIMEOUT)
+
+    # Wait for workers to finish and shut down
+    def close(self):
+        if self.isFutures:
+            self.pool.shutdown(wait=True)
+        else:
+            self.pool.close()
+            self.pool.join()
+        if self.manager is not None:
+            self.manager.shutdown()
+
+    # Shut down without waiting for workers
+    def terminate(self):
+        if self.isFutures:
+            self.pool.shutdown(wait=False)
+        else:
+            self.pool.terminate()
+            self.pool.join()
+        if self.manager is not None:
+            self.manager.shutdown()
+
+
+# Return the CPUs the benchmarks may use, as a list of dictionaries with
+# CPU number, socket (physical package) and core id, read from sysfs.
+# Without topology information, all CPUs are treated as separate cores of one socket.
+def cpu_topology():
+    if hasattr(os, 'sched_getaffinity'):
+        cpuNumbers = sorted(os.sched_getaffinity(0))
+    else:
+        cpuNumbers = list(range(mp.cpu_count()))
+    topology = []
+    for cpu in cpuNumbers:
+        entry = {'cpu': cpu, 'socket': 0, 'core': cpu}
+        for key, fileName in (('socket', 'physical_package_id'), ('core', 'core_id')):
+            try:
+                with open('/sys/devices/system/cpu/cpu' + str(cpu) + '/topology/' + fileName, 'r') as topologyFile:
+                    entry[key] = int(topologyFile.read().strip())
+            except (IOError, ValueError):
+                pass
+        topology.append(entry)
+    return topology
+
+
+# Return number of sockets, physical cores and CPUs of a topology
+def topology_summary(topology):
+    return {'sockets': len(set(entry['socket'] for entry in topology)),
+            'cores': len(set((entry['socket'], entry['core']) for entry in topology)),
+            'cpus': len(topology)}
+
+
+# Available affinity policies
+affinityPolicies = ['none', 'compact', 'scatter', 'per-socket']
+
+
+# Return None if an affinity policy can be used with this interpreter, otherwise the reason why not
+def affinity_unavailable_reason(policy):
+    if policy != 'none' and not hasattr(os, 'sched_setaffinity'):
+        return 'os.sched_setaffinity is not available (needs Python 3.3+ on Linux)'
+    return None
+
+
+# Return the CPUs of each worker slot for an affinity policy, or None to not pin workers.
+# Worker n of a measurement is pinned to the CPUs of slot n modulo the number of slots.
+def worker_placement(policy, topology):
+    if policy == 'none':
+        return None
+
+    sockets = sorted(set(entry['socket'] for entry in topology))
+    if policy == 'per-socket':
+        return [sorted(entry['cpu'] for entry in topology if entry['socket'] == socket) for socket in sockets]
+
+    if policy == 'compact':
+        order = sorted(topology, key=lambda entry: (entry['socket'], entry['core'], entry['cpu']))
+        return [[entry['cpu']] for entry in order]
+
+    # Scatter: order the CPUs of each socket by SMT sibling rank, so all
+    # physical cores are used first, then take one CPU per socket in turn
+    socketOrders = []
+    for socket in sockets:
+        siblingRank = {}
+        ranked = []
+        for entry in sorted([entry for entry in topology if entry['socket'] == socket], key=lambda entry: (entry['core'], entry['cpu'])):
+            rank = siblingRank.get(entry['core'], 0)
+            siblingRank[entry['core']] = rank + 1
+            ranked.append((rank, entry['core'], entry['cpu']))
+        socketOrders.append([cpu for rank, core, cpu in sorted(ranked)])
+    placement = []
+    for index in range(max(len(order) for order in socketOrders)):
+        for order in socketOrders:
+            if index < len(order):
+                placement.append([order[index]])
+    return placement
 
-    if threadCount <= 1:
-        return
 
-    log.info('Matrix multiplication test: ' + str(threadCount) + ' threads...')
-    processes = []
-    values = []
-    multiCount = 0
-    for t in range(threadCount):
-        count = mp.Value('i', 0)
-        values.append(count)
-        proc = mp.Process(target=workerMatrixMultiplication, args=(timeLimitVal, count))
-        processes.append(proc)
+#####################################
+#
+# Benchmarks
+#
+#####################################
+
+# Max. time in seconds to wait for a pool stage to finish
+POOL_TIMEOUT = 86400
+
+
+# Run a stage descriptor on workerCount workers of the pool
+# Throughput is normalized to operations per second of actually measured time,
+# as workers always finish their current batch after the time limit.
+# The batch latency histograms of all workers are merged. Worker n is pinned
+# to slot n of the placement in the settings, if there is one.
+def measure_workers(log, pool, descriptor, workerCount):
+    placement = descriptor[3].get('placement')
+    gate = None
+    if workerCount > 1 and 'setup' in stages[descriptor[0]]:
+        gate = pool.start_gate(workerCount)
+    workerResults = pool.map([descriptor + (placement[index % len(placement)] if placement else None, gate) for index in range(workerCount)])
+    histogram = LatencyHistogram()
+    for workerIndex, (ops, seconds, workerHistogram) in enumerate(workerResults):
+        log.debug('Worker ' + str(workerIndex) + ' calculated ' + str(ops) + ' values in ' + str(seconds) + ' seconds')
+        histogram.merge(workerHistogram)
+    workerResults = [(ops, seconds) for ops, seconds, workerHistogram in workerResults]
+    measured = {'ops': sum(ops for ops, seconds in workerResults),
+                'seconds': max(seconds for ops, seconds in workerResults),
+                'rate': sum(ops / seconds for ops, seconds in workerResults),
+                'batches': histogram.summary()}
+    unit = stages[descriptor[0]].get('unit')
+    if unit == 'flop':
+        measured['gflops'] = measured['rate'] / 1e9
+    elif unit == 'byte':
+        measured['gbytes'] = measured['rate'] / 1e9
+    elif unit == 'call':
+        measured['latency'] = sum(seconds / ops for ops, seconds in workerResults) / len(workerResults)
+    return measured
+
+
+# Format a latency in seconds for display
+def latency_msg(seconds):
+    if seconds >= 1.0:
+        return "{:.3f}".format(seconds) + ' s'
+    elif seconds >= 0.001:
+        return "{:.3f}".format(seconds * 1000.0) + ' ms'
+    return "{:.1f}".format(seconds * 1000000.0) + ' us'
+
+
+# Format batch latency percentiles of a measurement for display
+def batch_latency_msg(measured):
+    batches = measured['batches']
+    return ('Batch latency: p50 ' + latency_msg(batches['p50']) + ', p90 ' + latency_msg(batches['p90']) + ', p99 ' + latency_msg(batches['p99']) +
+            ', max ' + latency_msg(batches['max']) + ' (' + "{:,}".format(batches['count']) + ' batches)')
+
+
+# Format a throughput for display, per thread if threadCount is given
+def rate_msg(measured, threadCount=None):
+    if 'gflops' in measured:
+        msg = "{:.3f}".format(measured['gflops'] / (threadCount or 1)) + ' GFLOP/s'
+    elif 'gbytes' in measured:
+        msg = "{:.3f}".format(measured['gbytes'] / (threadCount or 1)) + ' GB/s'
+    elif 'latency' in measured:
+        if threadCount:
+            return "{:,.1f}".format(measured['rate'] / threadCount) + ' per thread'
+        return "{:,.1f}".format(measured['rate']) + ' per second, ' + "{:.3f}".format(measured['latency'] * 1000.0) + ' ms each'
+    else:
+        return "{:,.0f}".format(measured['rate'] / (threadCount or 1)) + (' per thread' if threadCount else ' per second')
+    return msg + ' per thread' if threadCount else msg
+
 
-    # Start all
-    for proc in processes:
-        proc.start()
-        log.debug('Started process ' + str(proc.pid))
+# Benchmark a stage, first with 1 worker, then with threadCount workers of the pool
+def test_stage(log, pool, stageName, threadCount, timeLimit, testIntensity, settings):
+    stage = stages[stageName]
+    descriptor = (stageName, timeLimit, testIntensity, settings)
 
-    # End all
-    for i, proc in enumerate(processes):
-        proc.join()
-        val = values[i].value
-        multiCount += val
-        log.debug('Process ' + str(proc.pid) + ' calculated ' + str(val) + ' values')
+    log.info(stage['title'] + ': 1 thread...')
+    single = measure_workers(log, pool, descriptor, 1)
+    log.info(stage['result'].format("{:,}".format(single['ops'])) + ' in ' + "{:.3f}".format(single['seconds']) + ' seconds (' + rate_msg(single) + ')')
+    log.info(batch_latency_msg(single))
 
-    log.info('Multiplied ' + "{:,}".format(multiCount) + ' matrices in ' + str(timeLimit) + ' seconds (' + "{:,}".format(multiCount / threadCount) + ' per thread)')
-    log.info(speedup_msg(singleCount, multiCount))
+    if threadCount <= 1:
+        return {'single': single}
+
+    log.info(stage['title'] + ': ' + str(threadCount) + ' threads...')
+    multi = measure_workers(log, pool, descriptor, threadCount)
+    log.info(stage['result'].format("{:,}".format(multi['ops'])) + ' in ' + "{:.3f}".format(multi['seconds']) + ' seconds (' + rate_msg(multi) + ', ' + rate_msg(multi, threadCount) + ')')
+    log.info(batch_latency_msg(multi))
+    log.info(speedup_msg(single['rate'], multi['rate']))
+    return {'single': single, 'multi': multi, 'threads': threadCount, 'speedup': multi['rate'] / single['rate']}
+
+
+# Minimum throughput gain per added worker (relative to a single worker) that
+# still counts as scaling. Below this, the knee of the scaling curve is reached.
+KNEE_MARGINAL_EFFICIENCY = 0.5
+
+
+# Return worker counts for scaling mode: 1, 2, 4, ... up to threadCount
+def scaling_steps(threadCount):
+    steps = []
+    workerCount = 1
+    while workerCount < threadCount:
+        steps.append(workerCount)
+        workerCount *= 2
+    steps.append(max(threadCount, 1))
+    return steps
+
+
+# Benchmark a stage with 1, 2, 4, ... threadCount workers of the pool,
+# report speedup and parallel efficiency per step, and find the knee
+# after which adding more workers doesn't help much anymore.
+def test_stage_scaling(log, pool, stageName, threadCount, timeLimit, testIntensity, settings):
+    stage = stages[stageName]
+    descriptor = (stageName, timeLimit, testIntensity, settings)
+
+    log.info(stage['title'] + ': scaling from 1 to ' + str(threadCount) + ' threads...')
+    log.info('{:>8}'.format('THREADS') + '{:>18}'.format('OPS/SEC') + '{:>10}'.format('SPEEDUP') + '{:>12}'.format('EFFICIENCY') + '{:>12}'.format('MARGINAL') + '{:>14}'.format('P50 BATCH') + '{:>14}'.format('P99 BATCH'))
+    steps = []
+    knee = None
+    for workerCount in scaling_steps(threadCount):
+        measured = measure_workers(log, pool, descriptor, workerCount)
+        if len(steps) == 0:
+            baseRate = measured['rate']
+            marginal = 1.0
+        else:
+            previous = steps[-1]
+            marginal = (measured['rate'] - previous['rate']) / ((workerCount - previous['workers']) * baseRate) if baseRate > 0.0 else 0.0
+            if knee is None and marginal < KNEE_MARGINAL_EFFICIENCY:
+                knee = previous['workers']
+        speedup = measured['rate'] / baseRate if baseRate > 0.0 else 0.0
+        measured.update({'workers': workerCount, 'speedup': speedup, 'efficiency': speedup / workerCount, 'marginal': marginal})
+        steps.append(measured)
+        log.info('{:8d}'.format(workerCount) + '{:18,.0f}'.format(measured['rate']) + '{:9.2f}x'.format(speedup) + '{:11.1f}%'.format(measured['efficiency'] * 100.0) + '{:11.1f}%'.format(marginal * 100.0) + '{:>14}'.format(latency_msg(measured['batches']['p50'])) + '{:>14}'.format(latency_msg(measured['batches']['p99'])))
+
+    if knee is None:
+        log.info('No knee found, throughput scales up to ' + str(steps[-1]['workers']) + ' threads')
+    else:
+        log.info('Knee at ' + str(knee) + ' threads, more threads add less than ' + str(int(KNEE_MARGINAL_EFFICIENCY * 100)) + '% of a single thread\'s throughput each')
+
+    result = {'single': steps[0], 'scaling': steps, 'knee': knee, 'threads': threadCount}
+    if len(steps) > 1:
+        result['multi'] = steps[-1]
+        result['speedup'] = steps[-1]['speedup']
+    return result
 
 
 # List of available tests
-# Associated test function name(s) to test stage
+# Associates test name to test stage(s)
 tests = {}
-tests['count'] = [test_count]
-tests['random'] = [test_random]
-tests['sin'] = [test_sin]
-tests['float'] = [test_float]
-tests['matrix'] = [test_matrixmultiplication]
-tests['all'] = [test_count, test_random, test_sin, test_float, test_matrixmultiplication]
+tests['count'] = ['count']
+tests['random'] = ['random', 'random-numpy']
+tests['sin'] = ['sin', 'sin-numpy']
+tests['float'] = ['float', 'float-numpy']
+tests['matrix'] = ['matrix', 'matrix-blocked', 'matrix-numpy']
+tests['numpy'] = ['random-numpy', 'sin-numpy', 'float-numpy', 'matrix-numpy']
+tests['memory'] = ['memory-read', 'memory-copy', 'memory-random']
+tests['alloc'] = ['alloc-nogc', 'alloc', 'gc']
+tests['disk'] = ['disk-write', 'disk-write-sync', 'disk-read', 'disk-read-uncached', 'disk-random', 'disk-mmap', 'disk-fsync']
+tests['all'] = ['count', 'random', 'sin', 'float', 'matrix', 'matrix-blocked', 'random-numpy', 'sin-numpy', 'float-numpy', 'matrix-numpy']
+
+
+# Default settings of the NumPy and matrix stages
+DEFAULT_ARRAYSIZE = 100000
+DEFAULT_MATRIXSIZE = 256
+DEFAULT_BLOCKSIZE = 32
+
+# Default settings of the memory and alloc stages
+DEFAULT_MEMSIZE = 64
+DEFAULT_HEAPSIZE = 200000
+
+# Default settings of the disk stages
+DEFAULT_FILESIZE = 64
+
+
+# Log how much faster a vectorized stage is than its scalar counterpart
+def log_vectorized_speedup(log, stageName, results):
+    scalarName = stages[stageName].get('scalar')
+    if scalarName is None or scalarName not in results or stageName not in results:
+        return
+    for key in ('single', 'multi'):
+        if key in results[stageName] and key in results[scalarName] and results[scalarName][key]['rate'] > 0.0:
+            speedup = results[stageName][key]['rate'] / results[scalarName][key]['rate']
+            results[stageName].setdefault('vectorized', {})[key] = speedup
+            log.info('Vectorized speedup over ' + scalarName + ' (' + key + '): ' + "%1.1f" % (speedup) + 'x')
 
 
-def perform_benchmarks(log, threadCount, timeLimit, performTests, testIntensity=100):
-    # Calculate number of tests to perform
-    testCount = 0
+# Log how much throughput an allocation stage loses to the garbage collector
+def log_gc_overhead(log, stageName, results):
+    baselineName = stages[stageName].get('gcbaseline')
+    if baselineName is None or baselineName not in results or stageName not in results:
+        return
+    for key in ('single', 'multi'):
+        if key in results[stageName] and key in results[baselineName] and results[baselineName][key]['rate'] > 0.0:
+            overhead = 1.0 - results[stageName][key]['rate'] / results[baselineName][key]['rate']
+            results[stageName].setdefault('gcoverhead', {})[key] = overhead
+            log.info('GC overhead compared to ' + baselineName + ' (' + key + '): ' + "%1.1f" % (overhead * 100.0) + '%')
+
+
+def perform_benchmarks(log, threadCount, timeLimit, performTests, testIntensity=100, scaling=False, executorName='process', arraySize=DEFAULT_ARRAYSIZE, matrixSize=DEFAULT_MATRIXSIZE, blockSize=DEFAULT_BLOCKSIZE, memSize=DEFAULT_MEMSIZE, heapSize=DEFAULT_HEAPSIZE, diskDir=None, fileSize=DEFAULT_FILESIZE, affinity='none'):
+    topology = cpu_topology()
+    placement = worker_placement(affinity, topology)
+    settings = {'arraysize': arraySize, 'matrixsize': matrixSize, 'blocksize': blockSize, 'memsize': memSize, 'heapsize': heapSize, 'filesize': fileSize, 'placement': placement}
+    if diskDir is None:
+        diskDir = tempfile.gettempdir()
+
+    # Collect stages to perform, skip stages with missing libraries
+    performStages = []
+    skippedStages = {}
     for testStage in performTests:
-        testCount += len(tests[testStage])
+        for stageName in tests[testStage]:
+            reason = stage_unavailable_reason(stageName)
+            if reason is not None:
+                skippedStages[stageName] = reason
+            elif stageName not in performStages:
+                performStages.append(stageName)
+    testCount = len(performStages)
+    runsPerTest = len(scaling_steps(threadCount)) if scaling else 2
 
     print('=========================================')
     log.info('Performing benchmarks...')
@@ -361,17 +1138,306 @@ def perform_benchmarks(log, threadCount, timeLimit, performTests, testIntensity=
     log.info('Set time limit   : ' + str(timeLimit) + ' sec per test')
     log.info('Test intensity   : ' + str(testIntensity))
     log.info('Test stages      : ' + str(performTests))
-    log.info('Approx. duration : ' + str(timeLimit * testCount * 2) + ' sec')
+    if any(stages[stageName].get('requires') == 'numpy' for stageName in performStages):
+        log.info('NumPy            : ' + np.__version__ + ', ' + str(arraySize) + ' elements per call')
+    if any(stages[stageName].get('unit') == 'flop' for stageName in performStages):
+        log.info('Matrix size      : ' + str(matrixSize) + 'x' + str(matrixSize) + ', ' + str(blockSize) + 'x' + str(blockSize) + ' blocks')
+    if any(stages[stageName].get('setup') == memory_buffers_setup for stageName in performStages):
+        log.info('Memory buffers   : 2x ' + str(memSize) + ' MB per thread')
+    if any(stages[stageName].get('setup') == gc_heap_setup for stageName in performStages):
+        log.info('Long-lived heap  : ' + "{:,}".format(heapSize) + ' objects per thread')
+    diskStages = any(stages[stageName].get('setup') == disk_file_setup for stageName in performStages)
+    if diskStages:
+        log.info('Disk files       : ' + str(fileSize) + ' MB per thread in ' + diskDir)
+    for stageName in sorted(skippedStages.keys()):
+        log.info('Skipped stage    : ' + stageName + ' (' + skippedStages[stageName] + ')')
+    log.info('Executor         : ' + executorName + ' (' + executors[executorName] + ')')
+    log.info('GIL              : ' + ('enabled' if gil_enabled() else 'disabled (free-threaded)'))
+    summary = topology_summary(topology)
+    log.info('Topology         : ' + str(summary['sockets']) + ' socket(s), ' + str(summary['cores']) + ' core(s), ' + str(summary['cpus']) + ' CPU(s)')
+    if placement is None:
+        log.info('Affinity         : none, workers are not pinned')
+    else:
+        log.info('Affinity         : ' + affinity + ', worker CPUs ' + ' '.join(','.join(str(cpu) for cpu in cpus) for cpus in placement[:max(threadCount, 1)]))
+    log.info('Mode             : ' + ('scaling ' + str(scaling_steps(threadCount)) if scaling else 'single vs. multi'))
+    log.info('Approx. duration : ' + str(timeLimit * testCount * runsPerTest) + ' sec')
     print('=========================================')
     print('')
 
+    # Working directory for the files of the disk stages
+    if diskStages:
+        settings['diskdir'] = tempfile.mkdtemp(prefix='benchmarks-', dir=diskDir)
+
+    # Create worker pool once, all stages share its warm workers
+    pool = WorkerPool(executorName, max(threadCount, 1))
+    log.debug('Created ' + executorName + ' pool with ' + str(max(threadCount, 1)) + ' workers')
+
     # Iterate specified test stages
-    for testStage in performTests:
-        funcs = tests[testStage]
-        # Execute tests for each test stage
-        for func in funcs:
-            func(log, threadCount, timeLimit, testIntensity)
+    results = {}
+    try:
+        for stageName in performStages:
+            if scaling:
+                results[stageName] = test_stage_scaling(log, pool, stageName, threadCount, timeLimit, testIntensity, settings)
+            else:
+                results[stageName] = test_stage(log, pool, stageName, threadCount, timeLimit, testIntensity, settings)
+            log_vectorized_speedup(log, stageName, results)
+            log_gc_overhead(log, stageName, results)
             print('')
+    except:
+        pool.terminate()
+        raise
+    finally:
+        if diskStages:
+            shutil.rmtree(settings['diskdir'], ignore_errors=True)
+    pool.close()
+
+    return {'threads': threadCount, 'timelimit': timeLimit, 'intensity': testIntensity, 'mode': 'scaling' if scaling else 'multi', 'executor': executorName, 'arraysize': arraySize, 'matrixsize': matrixSize, 'blocksize': blockSize, 'memsize': memSize, 'heapsize': heapSize, 'diskdir': diskDir, 'filesize': fileSize, 'affinity': affinity, 'topology': summary, 'placement': placement, 'tests': results}
+
+
+# Print throughput of all stages side by side for each executor
+def print_executor_comparison(log, executorResults):
+    executorNames = sorted(executorResults.keys())
+    stageNames = sorted(set(stageName for results in executorResults.values() for stageName in results['tests'].keys()))
+    print('=========================================')
+    log.info('Executor comparison (operations per second):')
+    print('-----------------------------------------')
+    log.info('{:22}'.format('STAGE') + ''.join('{:>18}'.format(executorName) for executorName in executorNames))
+    for stageName in stageNames:
+        for key in ('single', 'multi'):
+            line = '{:22}'.format(stageName + '.' + key)
+            for executorName in executorNames:
+                stageResult = executorResults[executorName]['tests'].get(stageName, {})
+                if key in stageResult:
+                    line += '{:18,.0f}'.format(stageResult[key]['rate'])
+                else:
+                    line += '{:>18}'.format('-')
+            log.info(line)
+    print('=========================================')
+
+
+#####################################
+#
+# Result history
+#
+#####################################
+
+# History file, one JSON record per benchmark run
+SCRIPTPATH = os.path.dirname(os.path.abspath(os.path.join(__file__, os.pardir)))
+HISTORYFILE = 'benchmark_history.jsonl'
+
+# One-sided 95% critical values of Student's t distribution, by degrees of freedom
+T_CRITICAL = {1: 6.314, 2: 2.920, 3: 2.353, 4: 2.132, 5: 2.015, 6: 1.943, 7: 1.895, 8: 1.860, 9: 1.833, 10: 1.812, 15: 1.753, 20: 1.725, 30: 1.697}
+
+
+# Return the git revision of the scripts, or None
+def get_git_revision():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPTPATH, stderr=devnull)
+        return revision.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Return throughput metrics (operations per second, higher is better) of a benchmark result
+def history_metrics(results):
+    metrics = {}
+    for testName, testResult in results['tests'].items():
+        for key in ('single', 'multi'):
+            if key in testResult:
+                metrics[testName + '.' + key] = testResult[key]['rate']
+    return metrics
+
+
+# Return information about the host and the scripts, to tag results with
+def host_metadata():
+    return {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'host': socket.gethostname(),
+            'cpus': mp.cpu_count(),
+            'python': platform.python_version(),
+            'revision': get_git_revision()}
+
+
+# Build a history record from a benchmark result, tagged with host information
+def build_history_record(results):
+    record = host_metadata()
+    record.update({'settings': {'threads': results['threads'], 'timelimit': results['timelimit'], 'intensity': results['intensity'], 'mode': results['mode'], 'executor': results['executor'], 'arraysize': results['arraysize'], 'matrixsize': results['matrixsize'], 'blocksize': results['blocksize'], 'memsize': results['memsize'], 'heapsize': results['heapsize'], 'diskdir': results['diskdir'], 'filesize': results['filesize'], 'affinity': results['affinity']},
+                   'metrics': history_metrics(results)})
+    return record
+
+
+# Append a record to the history file
+def append_history(log, record):
+    path = os.path.join(SCRIPTPATH, HISTORYFILE)
+    try:
+        with open(path, 'a') as historyFile:
+            historyFile.write(json.dumps(record, sort_keys=True) + '\n')
+        log.info('Appended results to benchmark history ' + path)
+    except IOError:
+        log.error('Could not write benchmark history file: ' + path)
+
+
+# Load all records from the history file
+def load_history(log):
+    path = os.path.join(SCRIPTPATH, HISTORYFILE)
+    records = []
+    try:
+        with open(path, 'r') as historyFile:
+            for line in historyFile:
+                line = line.strip()
+                if line != '':
+                    records.append(json.loads(line))
+    except IOError:
+        log.error('Could not load benchmark history file: ' + path)
+    except ValueError:
+        log.error('Benchmark history file is damaged: ' + path)
+    return records
+
+
+# Return mean and sample standard deviation of a list of values
+def mean_stdev(values):
+    mean = sum(values) / float(len(values))
+    if len(values) < 2:
+        return mean, 0.0
+    variance = sum((value - mean) ** 2 for value in values) / float(len(values) - 1)
+    return mean, math.sqrt(variance)
+
+
+# Return True if value is a significant drop below the baseline values.
+# Tests whether the value lies below the one-sided 95% prediction interval
+# of the baseline. With a single baseline value, no test is possible.
+def is_significant_drop(baselineValues, value):
+    n = len(baselineValues)
+    if n < 2:
+        return None
+    mean, stdev = mean_stdev(baselineValues)
+    if stdev == 0.0:
+        return value < mean
+    df = n - 1
+    tCritical = T_CRITICAL[max([key for key in T_CRITICAL.keys() if key <= df])] if df <= 30 else 1.645
+    return (mean - value) / (stdev * math.sqrt(1.0 + 1.0 / n)) > tCritical
+
+
+# Compare latest history record with baseline records
+def compare_history(log, baselineRevision=None, threshold=5.0):
+    records = load_history(log)
+    if len(records) == 0:
+        log.error('No benchmark history available. Run some benchmarks first!')
+        return None
+
+    current = records[-1]
+    baseline = [record for record in records[:-1] if record['host'] == current['host'] and record['settings'] == current['settings']]
+    if baselineRevision is not None:
+        baseline = [record for record in baseline if (record.get('revision') or '').startswith(baselineRevision)]
+    log.info('Current run      : ' + current['time'] + ' (revision ' + str(current.get('revision')) + ', Python ' + current['python'] + ')')
+    log.info('Baseline runs    : ' + str(len(baseline)) + ' on host ' + current['host'] + ' with the same settings')
+    print('')
+    if len(baseline) == 0:
+        log.error('No baseline runs to compare with!')
+        return None
+
+    log.info('{:24}'.format('METRIC') + '{:>16}'.format('BASELINE') + '{:>16}'.format('CURRENT') + '{:>10}'.format('CHANGE') + '  VERDICT')
+    log.info('=' * 80)
+    comparison = {}
+    slowdowns = 0
+    for metric in sorted(current['metrics'].keys()):
+        values = [record['metrics'][metric] for record in baseline if metric in record['metrics']]
+        if len(values) == 0:
+            continue
+        mean, stdev = mean_stdev(values)
+        value = current['metrics'][metric]
+        change = (value - mean) / mean * 100.0 if mean > 0.0 else 0.0
+        significant = is_significant_drop(values, value)
+        if change > -threshold:
+            verdict = 'ok'
+        elif significant is None:
+            verdict = 'SLOWER? (need 2+ baseline runs)'
+        elif significant:
+            verdict = 'SLOWDOWN'
+            slowdowns += 1
+        else:
+            verdict = 'slower, within noise'
+        comparison[metric] = {'baseline': mean, 'stdev': stdev, 'runs': len(values), 'current': value, 'change': change, 'verdict': verdict}
+        log.info('{:24}'.format(metric) + '{:16,.0f}'.format(mean) + '{:16,.0f}'.format(value) + '{:+9.1f}%'.format(change) + '  ' + verdict)
+
+    print('')
+    if slowdowns > 0:
+        log.warning(str(slowdowns) + ' significant slowdown(s) detected!')
+    else:
+        log.info('No significant slowdowns detected.')
+    return {'current': current, 'baselineruns': len(baseline), 'metrics': comparison, 'slowdowns': slowdowns}
+
+
+#####################################
+#
+# Export
+#
+#####################################
+
+# Export formats
+exportFormats = ['json', 'csv']
+
+# Columns of exported records, in CSV column order
+EXPORT_COLUMNS = ['time', 'host', 'cpus', 'python', 'revision',
+                  'executor', 'affinity', 'sockets', 'cores', 'timelimit', 'intensity', 'mode',
+                  'stage', 'threads', 'ops', 'seconds', 'rate', 'speedup', 'efficiency', 'gflops', 'gbytes', 'latency',
+                  'batches', 'p50', 'p90', 'p99', 'max']
+
+
+# Build one flat record per stage and thread count of a benchmark result
+def export_records(results, metadata):
+    records = []
+    for stageName in sorted(results['tests'].keys()):
+        testResult = results['tests'][stageName]
+        if 'scaling' in testResult:
+            steps = testResult['scaling']
+        else:
+            steps = [dict(testResult['single'], workers=1, speedup=1.0, efficiency=1.0)]
+            if 'multi' in testResult:
+                steps.append(dict(testResult['multi'], workers=testResult['threads'], speedup=testResult['speedup'], efficiency=testResult['speedup'] / testResult['threads']))
+        for step in steps:
+            record = dict(metadata)
+            record.update({'executor': results['executor'],
+                           'affinity': results['affinity'],
+                           'sockets': results['topology']['sockets'],
+                           'cores': results['topology']['cores'],
+                           'timelimit': results['timelimit'],
+                           'intensity': results['intensity'],
+                           'mode': results['mode'],
+                           'stage': stageName,
+                           'threads': step['workers'],
+                           'batches': step['batches']['count'],
+                           'p50': step['batches']['p50'],
+                           'p90': step['batches']['p90'],
+                           'p99': step['batches']['p99'],
+                           'max': step['batches']['max']})
+            for key in ('ops', 'seconds', 'rate', 'speedup', 'efficiency', 'gflops', 'gbytes', 'latency'):
+                record[key] = step.get(key)
+            records.append(record)
+    return records
+
+
+# Write exported records to a file, as JSON list or CSV with header line
+def write_export(log, records, filename, exportFormat):
+    try:
+        if exportFormat == 'csv':
+            # The csv module wants binary files in Python 2, and text files without newline translation in Python 3
+            if sys.version_info[0] < 3:
+                exportFile = open(filename, 'wb')
+            else:
+                exportFile = open(filename, 'w', newline='')
+            with exportFile:
+                writer = csv.DictWriter(exportFile, EXPORT_COLUMNS)
+                writer.writeheader()
+                for record in records:
+                    writer.writerow(record)
+        else:
+            with open(filename, 'w') as exportFile:
+                exportFile.write(json.dumps(records, indent=4, sort_keys=True, separators=(',', ': ')))
+                exportFile.write('\n')
+        log.info('Exported ' + str(len(records)) + ' records to ' + filename)
+    except IOError:
+        log.error('Could not write export file: ' + filename)
 
 
 #####################################
@@ -403,6 +1469,7 @@ def perform_benchmarks(log, threadCount, timeLimit, performTests, testIntensity=
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -440,8 +1507,25 @@ def run(log, options, args):
     timeLimit = 2.0
     performTests = ['all']
     testIntensity = 1000
+    writeHistory = True
+    scaling = False
+    executorNames = ['process']
+    arraySize = DEFAULT_ARRAYSIZE
+    matrixSize = DEFAULT_MATRIXSIZE
+    blockSize = DEFAULT_BLOCKSIZE
+    memSize = DEFAULT_MEMSIZE
+    heapSize = DEFAULT_HEAPSIZE
+    diskDir = None
+    fileSize = DEFAULT_FILESIZE
+    affinity = 'none'
+    exportFormat = None
+    exportFile = None
+    compareMode = False
+    baselineRevision = None
+    threshold = 5.0
 
     for arg in args:
+        originalArg = arg
         arg = arg.upper()
         if arg[:7] == 'THREADS' and '=' in arg:
             threadCount = int(arg.split('=')[1])
@@ -458,15 +1542,92 @@ def run(log, options, args):
         elif arg[:5] == 'TESTS' and '=' in arg:
             performTests = arg.split('=')[1].lower()
             performTests = performTests.split(',')
-            if len(performTests) == 0 or (performTests not in tests.keys() and set(performTests).issubset(tests.keys()) == False):
-                log.error('Invalid tests specified: "' + str(performTests) + '". Possible options: ' + str(tests.keys()))
+            if len(performTests) == 0 or not set(performTests).issubset(tests.keys()):
+                log.error('Invalid tests specified: "' + str(performTests) + '". Possible options: ' + str(sorted(tests.keys())))
                 print('')
                 sys.exit()
         elif arg[:9] == 'INTENSITY' and '=' in arg:
-            testIntensity = float(arg.split('=')[1])
+            testIntensity = int(float(arg.split('=')[1]))
             if testIntensity < 1:
                 log.error('Invalid test intensity specified! Using default instead.')
-                testintensity = 1000
+                testIntensity = 1000
+        elif arg[:8] == 'EXECUTOR' and '=' in arg:
+            executorNames = arg.split('=')[1].lower().split(',')
+            for executorName in executorNames:
+                if executorName not in executors.keys():
+                    log.error('Invalid executor specified: "' + executorName + '". Possible options: ' + str(sorted(executors.keys())))
+                    print('')
+                    sys.exit()
+                reason = executor_unavailable_reason(executorName)
+                if reason is not None:
+                    log.error('Executor "' + executorName + '" is not available: ' + reason)
+                    print('')
+                    sys.exit()
+        elif arg[:9] == 'ARRAYSIZE' and '=' in arg:
+            arraySize = int(float(arg.split('=')[1]))
+            if arraySize < 1:
+                log.error('Invalid array size specified! Using default instead.')
+                arraySize = DEFAULT_ARRAYSIZE
+        elif arg[:10] == 'MATRIXSIZE' and '=' in arg:
+            matrixSize = int(float(arg.split('=')[1]))
+            if matrixSize < 1:
+                log.error('Invalid matrix size specified! Using default instead.')
+                matrixSize = DEFAULT_MATRIXSIZE
+        elif arg[:9] == 'BLOCKSIZE' and '=' in arg:
+            blockSize = int(float(arg.split('=')[1]))
+            if blockSize < 1:
+                log.error('Invalid block size specified! Using default instead.')
+                blockSize = DEFAULT_BLOCKSIZE
+        elif arg[:7] == 'MEMSIZE' and '=' in arg:
+            memSize = int(float(arg.split('=')[1]))
+            if memSize < 1:
+                log.error('Invalid memory size specified! Using default instead.')
+                memSize = DEFAULT_MEMSIZE
+        elif arg[:8] == 'HEAPSIZE' and '=' in arg:
+            heapSize = int(float(arg.split('=')[1]))
+            if heapSize < 0:
+                log.error('Invalid heap size specified! Using default instead.')
+                heapSize = DEFAULT_HEAPSIZE
+        elif arg[:7] == 'DISKDIR' and '=' in arg:
+            diskDir = originalArg.split('=', 1)[1]
+            if not os.path.isdir(diskDir):
+                log.error('Invalid disk directory specified: "' + diskDir + '" is not a directory')
+                print('')
+                sys.exit()
+        elif arg[:8] == 'FILESIZE' and '=' in arg:
+            fileSize = int(float(arg.split('=')[1]))
+            if fileSize < 1:
+                log.error('Invalid file size specified! Using default instead.')
+                fileSize = DEFAULT_FILESIZE
+        elif arg[:8] == 'AFFINITY' and '=' in arg:
+            affinity = arg.split('=')[1].lower()
+            if affinity not in affinityPolicies:
+                log.error('Invalid affinity specified: "' + affinity + '". Possible options: ' + str(affinityPolicies))
+                print('')
+                sys.exit()
+            reason = affinity_unavailable_reason(affinity)
+            if reason is not None:
+                log.error('Affinity "' + affinity + '" is not available: ' + reason)
+                print('')
+                sys.exit()
+        elif arg[:6] == 'FORMAT' and '=' in arg:
+            exportFormat = arg.split('=')[1].lower()
+            if exportFormat not in exportFormats:
+                log.error('Invalid format specified: "' + exportFormat + '". Possible options: ' + str(exportFormats))
+                print('')
+                sys.exit()
+        elif arg[:3] == 'OUT' and '=' in arg:
+            exportFile = originalArg.split('=', 1)[1]
+        elif arg == 'SCALING':
+            scaling = True
+        elif arg == 'NOHISTORY':
+            writeHistory = False
+        elif arg == 'COMPARE':
+            compareMode = True
+        elif arg[:8] == 'BASELINE' and '=' in arg:
+            baselineRevision = arg.split('=')[1].lower()
+        elif arg[:9] == 'THRESHOLD' and '=' in arg:
+            threshold = abs(float(arg.split('=')[1]))
         elif arg == 'HELP':
             print(SCRIPT_HELP)
             print('')
@@ -476,5 +1637,31 @@ def run(log, options, args):
             print('')
             sys.exit()
 
+    if exportFormat is not None and exportFile is None:
+        log.error('Format "' + exportFormat + '" needs an export file, use out=FILE')
+        print('')
+        sys.exit()
+
     print('')
-    perform_benchmarks(log, threadCount, timeLimit, performTests, testIntensity)
+    if compareMode:
+        return compare_history(log, baselineRevision, threshold)
+
+    executorResults = {}
+    exportedRecords = []
+    metadata = host_metadata()
+    for executorName in executorNames:
+        results = perform_benchmarks(log, threadCount, timeLimit, performTests, testIntensity, scaling, executorName, arraySize, matrixSize, blockSize, memSize, heapSize, diskDir, fileSize, affinity)
+        if writeHistory:
+            append_history(log, build_history_record(results))
+        exportedRecords.extend(export_records(results, metadata))
+        executorResults[executorName] = results
+        print('')
+
+    if exportFile is not None:
+        write_export(log, exportedRecords, exportFile, exportFormat or 'json')
+        print('')
+
+    if len(executorNames) == 1:
+        return executorResults[executorNames[0]]
+    print_executor_comparison(log, executorResults)
+    return {'executors': executorResults}
@@ -37,6 +37,7 @@ SCRIPTINFO = 'Use this to throw a W6.'
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -70,5 +71,8 @@ def run(log, options, args):
     log.info(get_name())
 
     print('')
-    log.info(random.randint(1, 6))
+    result = random.randint(1, 6)
+    log.info(result)
     print('')
+
+    return {'dice': result}
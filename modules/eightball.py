@@ -81,6 +81,7 @@ def magic_eightball():
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -119,5 +120,8 @@ def run(log, options, args):
     # Here we go
     log.info('Question: ' + options.magic_eightball)
     print('')
-    log.info(magic_eightball())
+    answer = magic_eightball()
+    log.info(answer)
     print('')
+
+    return {'question': options.magic_eightball, 'answer': answer}
@@ -57,6 +57,7 @@ def caesar_decrypt(msg, shiftVal):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -114,3 +115,5 @@ def run(log, options, args):
         log.debug('Test passed! Decrypted string equals input msg!')
     else:
         log.error('Test failed! Decrypted string does not equal input msg!!')
+
+    return {'msg': inputStr, 'shift': shiftVal, 'encrypted': encryptedStr, 'decrypted': decryptedStr}
@@ -1,4 +1,5 @@
 #!/usr/bin/python
+import binascii
 from itertools import cycle, izip
 
 
@@ -42,6 +43,7 @@ def xor_encrypt(msg, key):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -95,3 +97,6 @@ def run(log, options, args):
         log.debug('Test passed! Decrypted string equals input msg!')
     else:
         log.error('Test failed! Decrypted string does not equal input msg!!')
+
+    # Encrypted string is binary, so it's returned hex encoded
+    return {'msg': inputStr, 'key': keyStr, 'encrypted': binascii.hexlify(encryptedStr), 'decrypted': decryptedStr}
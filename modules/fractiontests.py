@@ -63,6 +63,7 @@ def simplify(a, b):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -114,9 +115,10 @@ def run(log, options, args):
     elif fractFunc == 'simplify':
         simplifyResult = simplify(a, b)
         log.info(simplifyResult[1])
-        return
+        return {'function': fractFunc, 'a': a, 'b': b, 'result': simplifyResult[2:]}
     else:
         log.error('Unknown fraction function: ' + fractFunc)
-        return
+        return None
 
     log.info(fractFunc + '(' + str(a) + ' / ' + str(b) + ') = ' + '{0:.5f}'.format(result))
+    return {'function': fractFunc, 'a': a, 'b': b, 'result': result}
@@ -53,6 +53,7 @@ def google_translate(fromLang, toLang, text, log):
 
     resultTranslate = translator.translate(text, src=fromLang, dest=toLang)
     log.info(resultTranslate.text)
+    return resultTranslate.text
 
 
 #####################################
@@ -84,6 +85,7 @@ def google_translate(fromLang, toLang, text, log):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -140,4 +142,5 @@ def run(log, options, args):
         log.error('Invalid destination language!')
         sys.exit()
 
-    google_translate(fromLang, toLang, text, log)
+    translation = google_translate(fromLang, toLang, text, log)
+    return {'source': fromLang, 'dest': toLang, 'text': text, 'translation': translation}
@@ -106,6 +106,7 @@ def do_hash(log, mode, source):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -150,3 +151,5 @@ def run(log, options, args):
     hashResult = do_hash(log, hashMode, hashSource)
 
     log.info(hashResult)
+
+    return {'mode': hashMode, 'source': hashSource, 'hash': hashResult}
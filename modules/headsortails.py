@@ -37,6 +37,7 @@ SCRIPTINFO = 'Heads or Tails? Get help with your decision.'
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -71,5 +72,8 @@ def run(log, options, args):
 
     print('')
     headsortails = ['HEADS', 'TAILS']
-    log.info(random.choice(headsortails))
+    result = random.choice(headsortails)
+    log.info(result)
     print('')
+
+    return {'coin': result}
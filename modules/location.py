@@ -42,6 +42,8 @@ def print_geolocation(log, ip='me'):
     except AttributeError as err:
         log.error('Unexpected error:' + str(err))
 
+    return geo.json if geo.ok else None
+
 
 #####################################
 #
@@ -72,6 +74,7 @@ def print_geolocation(log, ip='me'):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -106,4 +109,4 @@ def run(log, options, args):
     log.info('Getting geolocation info...')
     print('')
     ip = options.location
-    print_geolocation(log, ip)
+    return print_geolocation(log, ip)
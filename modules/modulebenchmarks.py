@@ -0,0 +1,337 @@
+#!/usr/bin/python
+import os
+import sys
+import json
+import math
+import timeit
+import logging
+import platform
+
+import modules
+
+
+# Script info
+SCRIPTTITLE = 'Module Benchmarks'
+SCRIPTVERSION = '0.1'
+SCRIPTINFO = 'Measure the performance of the hot functions of other modules'
+SCRIPT_HELP = """
+Usage:
+  --modulebenchmarks [cases=n] [reps=n] [warmup=n] [mintime=n] [out=FILE] [help]
+
+Examples:
+  --modulebenchmarks
+      Benchmark all available cases with default settings
+
+  --modulebenchmarks cases=sieve,hash reps=50
+      Benchmark sieve and hash, with 50 repetitions each
+
+  --modulebenchmarks out=results.json
+      Benchmark all cases and write results to a JSON file
+
+cases
+    A comma separated list with the cases that should be benchmarked.
+
+reps
+    Number of timed repetitions per case. Default is 20.
+
+warmup
+    Number of untimed calls per case before measuring. Default is 3.
+
+mintime
+    Minimum duration in seconds of a single repetition. Fast functions are
+    called several times per repetition to reach it. Default is 0.01.
+
+out
+    Write results to a JSON file.
+
+help
+    Displays this help, so you propably already know this one.
+"""
+
+
+# Logger for benchmarked functions that log, so logging doesn't get measured
+quietLog = logging.getLogger('modulebenchmarks.quiet')
+quietLog.addHandler(logging.NullHandler())
+quietLog.propagate = False
+
+
+# Sample text for text processing cases
+SAMPLETEXT = ' '.join(['The quick brown fox jumps over the lazy dog.',
+                       'Hansel and Gretel found a house made of bread and cake in the middle of the forest.',
+                       'Nobody could have expected that the old woman living there was a wicked witch!'] * 40)
+
+
+#####################################
+#
+# Benchmark cases
+#
+#####################################
+#
+# Each setup function prepares a case and returns a function without
+# arguments that performs one call of the benchmarked hot function.
+
+
+def setup_sieve():
+    primenumbers = modules.load_module('primenumbers')
+    return lambda: list(primenumbers.sieve_of_eratosthenes(100000))
+
+
+def setup_hash():
+    hashModule = modules.load_module('hash')
+    source = SAMPLETEXT * 10
+    return lambda: hashModule.do_hash(quietLog, 'sha256', source)
+
+
+def setup_analysetext():
+    analysetext = modules.load_module('analysetext')
+    return lambda: analysetext.analyze_text(quietLog, SAMPLETEXT)
+
+
+def setup_namegen():
+    namegen = modules.load_module('namegen')
+    nameGen = namegen.NameGenerator()
+    dataFile = os.path.join(os.path.dirname(os.path.realpath(namegen.__file__)), namegen.DATAFILENAME)
+    if nameGen.load_data(dataFile, quietLog) == False:
+        raise IOError('Could not load ' + dataFile)
+    return lambda: nameGen.generate(quietLog, 'random')
+
+
+def setup_xor():
+    encrypt_xor = modules.load_module('encrypt_xor')
+    return lambda: encrypt_xor.xor_encrypt(SAMPLETEXT, 'Passphrase1234')
+
+
+def setup_caesar():
+    encrypt_caesar = modules.load_module('encrypt_caesar')
+    return lambda: encrypt_caesar.caesar_encrypt(SAMPLETEXT, 3)
+
+
+def setup_asciiart():
+    asciiart = modules.load_module('asciiart')
+    # Gradient test image, so all ASCII chars are used
+    image = asciiart.Image.new('L', (320, 240))
+    image.putdata([(x + y) % 256 for y in range(240) for x in range(320)])
+    return lambda: asciiart.convert_image_to_ascii(image)
+
+
+def setup_tictactoe():
+    tictactoe = modules.load_module('tictactoe')
+    # Board without a winning move, so all fields are checked
+    game = tictactoe.TicTacToeEngine()
+    game._board.set_field(0, 0)
+    game._board.set_field(4, 1)
+    game._board.set_field(8, 0)
+    return lambda: game.suggest_move(1)
+
+
+# List of available cases
+cases = {}
+cases['sieve'] = setup_sieve
+cases['hash'] = setup_hash
+cases['analysetext'] = setup_analysetext
+cases['namegen'] = setup_namegen
+cases['xor'] = setup_xor
+cases['caesar'] = setup_caesar
+cases['asciiart'] = setup_asciiart
+cases['tictactoe'] = setup_tictactoe
+
+
+#####################################
+#
+# Harness
+#
+#####################################
+
+# Return the p-th percentile (0..100) of a sorted list, nearest rank method
+def percentile(sortedValues, p):
+    index = int(math.ceil(p / 100.0 * len(sortedValues))) - 1
+    return sortedValues[max(0, min(index, len(sortedValues) - 1))]
+
+
+# Call func number times, return total duration in seconds
+def time_calls(func, number):
+    timeStart = timeit.default_timer()
+    for i in range(number):
+        func()
+    return timeit.default_timer() - timeStart
+
+
+# Measure a function, return statistics of seconds per call
+def measure(func, repetitions, warmup, minTime):
+    for i in range(warmup):
+        func()
+
+    # Calibrate number of calls per repetition
+    number = 1
+    while True:
+        duration = time_calls(func, number)
+        if duration >= minTime:
+            break
+        if duration <= 0.0:
+            number *= 10
+        else:
+            number = max(number + 1, int(number * min(minTime / duration * 1.2, 10.0)))
+
+    samples = sorted([time_calls(func, number) / number for r in range(repetitions)])
+    return {'calls': number,
+            'repetitions': repetitions,
+            'min': samples[0],
+            'median': percentile(samples, 50),
+            'p95': percentile(samples, 95),
+            'max': samples[-1],
+            'mean': sum(samples) / len(samples)}
+
+
+# Format a duration in seconds for display
+def format_duration(seconds):
+    if seconds >= 1.0:
+        return '{:10.3f} s '.format(seconds)
+    elif seconds >= 0.001:
+        return '{:10.3f} ms'.format(seconds * 1000.0)
+    return '{:10.3f} us'.format(seconds * 1000000.0)
+
+
+def perform_benchmarks(log, performCases, repetitions, warmup, minTime):
+    print('=========================================')
+    log.info('Performing module benchmarks...')
+    print('-----------------------------------------')
+    log.info('Cases            : ' + str(performCases))
+    log.info('Repetitions      : ' + str(repetitions))
+    log.info('Warmup calls     : ' + str(warmup))
+    log.info('Min. rep. time   : ' + str(minTime) + ' sec')
+    print('=========================================')
+    print('')
+
+    results = {}
+    log.info('{:12}'.format('CASE') + '{:>14}'.format('MEDIAN') + '{:>14}'.format('P95') + '{:>14}'.format('MIN') + '{:>10}'.format('CALLS'))
+    log.info('=' * 64)
+    for caseName in performCases:
+        try:
+            func = cases[caseName]()
+        except Exception as e:
+            log.warning('{:12}'.format(caseName) + 'skipped, setup failed: ' + str(e))
+            continue
+        stats = measure(func, repetitions, warmup, minTime)
+        results[caseName] = stats
+        log.info('{:12}'.format(caseName) + format_duration(stats['median']) + format_duration(stats['p95']) + format_duration(stats['min']) + '{:10d}'.format(stats['calls']))
+
+    return {'python': platform.python_version(),
+            'host': platform.node(),
+            'repetitions': repetitions,
+            'warmup': warmup,
+            'mintime': minTime,
+            'cases': results}
+
+
+# Write results dictionary to a JSON file
+def write_results(log, results, filename):
+    try:
+        with open(filename, 'w') as jsonFile:
+            jsonFile.write(json.dumps(results, indent=4, sort_keys=True, separators=(',', ': ')))
+        log.info('Wrote results to ' + filename)
+    except IOError:
+        log.error('Could not write results to ' + filename)
+
+
+#####################################
+#
+# Module integration
+#
+#####################################
+#
+# Functions
+# ---------
+#
+# setup_args(parser)
+#    Adds arguments to the args parser
+#
+# get_name()
+#    Return the module's name
+#
+# get_info()
+#    Return the module's info string
+#
+# check_options(log, options)
+#    Return True if main function can be run, depending on the command line arguments. If not dependent on any arguments, just return True
+#    logger object and command line options dictionary are passed
+#
+# check_additional_options(log, options)
+#    Return True if all arguments are not only set, but also make sense
+#    logger object and command line options dictionary are passed
+#
+# run(log, options)
+#    Main function where all the magic's happening.
+#    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
+
+
+# Add command line arguments for this script to args parser
+def setup_args(optGroup):
+    optGroup.add_option('--modulebenchmarks', action='store_true', dest='modulebenchmarks', default=None, help='Benchmark the hot functions of other modules')
+
+
+# Return True if args/options tell us to run this module
+def check_options(log, options, args):
+    return options.modulebenchmarks is not None and options.modulebenchmarks == True
+
+
+# Checks additional arguments and prints error messages
+def check_additional_options(log, options, args):
+    return True
+
+
+# Return module name
+def get_name():
+    return SCRIPTTITLE + ' ' + SCRIPTVERSION
+
+
+# Return module info
+def get_info():
+    return SCRIPTINFO
+
+
+# Perform module benchmarks
+def run(log, options, args):
+    # Welcome
+    log.info(get_name())
+
+    # Parse args
+    performCases = sorted(cases.keys())
+    repetitions = 20
+    warmup = 3
+    minTime = 0.01
+    outFile = None
+
+    for arg in args:
+        argUpper = arg.upper()
+        if argUpper[:5] == 'CASES' and '=' in arg:
+            performCases = arg.split('=')[1].lower().split(',')
+            if not set(performCases).issubset(cases.keys()):
+                log.error('Invalid cases specified: "' + str(performCases) + '". Possible options: ' + str(sorted(cases.keys())))
+                print('')
+                sys.exit()
+        elif argUpper[:4] == 'REPS' and '=' in arg:
+            repetitions = max(int(arg.split('=')[1]), 1)
+        elif argUpper[:6] == 'WARMUP' and '=' in arg:
+            warmup = max(int(arg.split('=')[1]), 0)
+        elif argUpper[:7] == 'MINTIME' and '=' in arg:
+            minTime = max(float(arg.split('=')[1]), 0.0)
+        elif argUpper[:3] == 'OUT' and '=' in arg:
+            outFile = arg.split('=', 1)[1]
+        elif argUpper == 'HELP':
+            print(SCRIPT_HELP)
+            print('')
+            sys.exit()
+        else:
+            log.error('Unsupported argument: ' + arg + '. Use "help" instead to get instructions.')
+            print('')
+            sys.exit()
+
+    print('')
+    results = perform_benchmarks(log, performCases, repetitions, warmup, minTime)
+
+    if outFile is not None:
+        print('')
+        write_results(log, results, outFile)
+
+    return results
@@ -312,6 +312,7 @@ class NameGenerator:
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -384,5 +385,10 @@ def run(log, options, args):
             print('')
 
     # Generate name(s)
+    names = []
     for i in range(nameCount):
-        log.info((str(i + 1) + '. ' if nameCount > 1 else '') + nameGen.generate(log, nameGender, nameGenerateMode))
+        name = nameGen.generate(log, nameGender, nameGenerateMode)
+        names.append(name)
+        log.info((str(i + 1) + '. ' if nameCount > 1 else '') + name)
+
+    return {'names': names}
@@ -1,6 +1,19 @@
 #!/usr/bin/python
+import os
 import time
 import math
+import mmap
+import struct
+import bisect
+import itertools
+import collections
+import multiprocessing as mp
+
+# Python 2/3 compatibility, don't allocate lists for huge ranges
+try:
+    range = xrange
+except NameError:
+    pass
 
 
 # Script info
@@ -9,7 +22,13 @@ SCRIPTVERSION = '0.3'
 SCRIPTINFO = 'Calculate prime numbers using an ancient technique'
 SCRIPT_HELP = """
 Usage:
-  --primenumbers COUNT [print] [help]
+  --primenumbers COUNT [print] [workers=n] [cache] [cachefile=FILE] [help]
+  --primenumbers isprime N [cachefile=FILE]
+  --primenumbers nextprime N
+  --primenumbers range A B [print] [workers=n]
+  --primenumbers pi N [workers=n] [cachefile=FILE]
+  --primenumbers nth K [workers=n] [cachefile=FILE]
+  --primenumbers count N
 
 Examples:
   --primenumbers 50000 print
@@ -18,9 +37,62 @@ Examples:
   --primenumbers 1000000
       Silently calculate prime number up to 1000000
 
+  --primenumbers 10000000000
+      Count prime numbers up to 10^10. Memory use only grows with the square
+      root of the limit, as the numbers are sieved segment by segment.
+
+  --primenumbers 10000000000 workers=32
+      Count prime numbers up to 10^10 with 32 processes
+
+  --primenumbers 100000000 cache
+      Count prime numbers up to 10^8 and keep the sieve in the prime cache
+
+  --primenumbers isprime 99999989
+      Look up whether 99999989 is prime in the prime cache
+
+  --primenumbers isprime 18446744073709551557
+      Test whether 2^64 - 59 is prime. Beyond the prime cache, numbers are
+      tested with Miller-Rabin, which is deterministic for 64 bit numbers.
+
+  --primenumbers nextprime 1000000000000
+      Find the smallest prime number > 10^12 with Miller-Rabin
+
+  --primenumbers range 1000000000000000 1000000010000000
+      Count prime numbers from 10^15 to 10^15 + 10^7. Only this window is
+      sieved, with the base primes up to the square root of 10^15 + 10^7.
+      B must be <= 10^16.
+
+  --primenumbers pi 1000000
+      Look up how many prime numbers are <= 1000000 in the prime cache
+
+  --primenumbers nth 1000000
+      Look up the millionth prime number in the prime cache. The prime cache
+      is limited to numbers up to 10^9, use count for larger pi queries.
+
+  --primenumbers count 1000000000000
+      Count prime numbers <= 10^12 with Lucy_Hedgehog's algorithm, in
+      O(N^(3/4)) time and O(sqrt(N)) memory. Takes seconds with NumPy
+      installed, about a minute without. Up to 10^8, the count is
+      cross-checked with the sieve.
+
 print
     All found prime numbers will be printed on screen
 
+workers
+    Number of processes that sieve segments in parallel. Use workers=0 for
+    one process per CPU. Default is 1.
+
+cache
+    Use the prime cache instead of sieving again. The cache keeps the sieve
+    in a file, which is memory mapped for lookups. If the cache doesn't
+    reach far enough yet, only the missing numbers are sieved and appended.
+    The pi and nth queries always use the cache, isprime uses it if the
+    cache already contains N. The cache is grown in a temporary file that
+    replaces the old one when complete, so several processes can share it.
+
+cachefile
+    File of the prime cache. Default is primes.cache in the scripts folder.
+
 help
     Displays this help, so you propably already know this one.
 """
@@ -30,19 +102,511 @@ def sieve_of_eratosthenes(limit):
     '''Prime number generator. Yields the series
     2, 3, 5, 7, 11, 13, 17, 19, 23, 29 ...
     using Sieve of Eratosthenes.
+    Only odd numbers are stored, one byte each: flags[i] is 1 if 2*i+1 is prime.
     '''
     yield 2
     sub_limit = int(limit**0.5)
-    flags = [True, True] + [False] * (limit - 2)
-    # Step through all the odd numbers
-    for i in range(3, limit, 2):
-        if flags[i]:
-            continue
+    flags = bytearray(b'\x01') * (limit // 2)
+    if len(flags) > 0:
+        flags[0] = 0
+    # Step through all the odd numbers up to sqrt(limit)
+    for i in range(3, sub_limit + 1, 2):
+        if flags[i // 2]:
+            # Exclude further multiples of the current prime number. Odd
+            # multiples are 2*i apart, which is a step of i in flags.
+            start = i * i // 2
+            flags[start::i] = bytearray((len(flags) - 1 - start) // i + 1)
+    for i in itertools.compress(range(1, limit, 2), flags):
         yield i
-        # Exclude further multiples of the current prime number
-        if i <= sub_limit:
-            for j in range(i*i, limit, i<<1):
-                flags[j] = True
+
+
+# Numbers per window of the segmented sieve. Only odd numbers are stored,
+# so a segment takes 256 KB and fits into the L2 cache.
+SEGMENT_SIZE = 2 * 256 * 1024
+
+
+# Return the window size for sieving numbers below limit. Every window loops
+# over all base primes, so beyond 2.7 * 10^11 windows grow with sqrt(limit),
+# otherwise the loop over the base primes would dominate the sieving.
+def segment_size(limit):
+    return max(SEGMENT_SIZE, integer_sqrt(limit))
+
+
+# Return the largest integer r with r*r <= n
+def integer_sqrt(n):
+    root = int(math.sqrt(n))
+    while root * root > n:
+        root -= 1
+    while (root + 1) * (root + 1) <= n:
+        root += 1
+    return root
+
+
+# Return the base primes for sieving all numbers below limit, the primes up to sqrt(limit)
+def base_primes(limit):
+    root = integer_sqrt(max(limit - 1, 0))
+    return [p for p in sieve_of_eratosthenes(root + 1) if p <= root]
+
+
+# Sieve the odd numbers low <= n < high with base primes containing at least
+# all primes up to sqrt(high). Returns a bytearray with 1 at index j if the
+# j-th odd number of the range, (low | 1) + 2*j, is prime, 0 otherwise.
+def sieve_segment(low, high, primes):
+    firstOdd = low | 1
+    segment = bytearray(b'\x01') * max((high - firstOdd + 1) // 2, 0)
+    if firstOdd == 1 and len(segment) > 0:
+        segment[0] = 0
+    length = len(segment)
+    for p in primes:
+        if p == 2:
+            continue
+        square = p * p
+        if square >= high:
+            break
+        # Index of the first odd multiple of p in the segment, smaller multiples
+        # than p*p are struck by smaller primes. firstOdd + 2*index is a multiple
+        # of p for index = -(firstOdd + p) / 2 mod p.
+        if square > firstOdd:
+            index = (square - firstOdd) // 2
+        else:
+            index = -((firstOdd + p) // 2) % p
+        if index + p >= length:
+            # Far above zero, most base primes hit a segment once at most
+            if index < length:
+                segment[index] = 0
+        else:
+            segment[index::p] = bytearray((length - 1 - index) // p + 1)
+    return segment
+
+
+# Yield the primes low <= n < high, sieved with sieve_segment()
+def segment_primes(low, high, primes):
+    if low <= 2 < high:
+        yield 2
+    for n in itertools.compress(range(low | 1, high, 2), sieve_segment(low, high, primes)):
+        yield n
+
+
+# Return the number of primes low <= n < high, sieved with sieve_segment()
+def segment_count(low, high, primes):
+    count = sieve_segment(low, high, primes).count(b'\x01')
+    if low <= 2 < high:
+        count += 1
+    return count
+
+
+# Yield (low, high) windows of segmentSize numbers covering start <= n < limit
+def segment_windows(limit, segmentSize, start=0):
+    low = start
+    while low < limit:
+        yield low, min(low + segmentSize, limit)
+        low += segmentSize
+
+
+# Base primes of a worker process, set once when the pool starts
+workerPrimes = None
+
+def init_worker(primes):
+    global workerPrimes
+    workerPrimes = primes
+
+
+# Pool tasks, sieve a window with the worker's base primes
+def segment_primes_task(window):
+    return list(segment_primes(window[0], window[1], workerPrimes))
+
+
+def segment_count_task(window):
+    return segment_count(window[0], window[1], workerPrimes)
+
+
+def sieve_segment_task(window):
+    return bytes(sieve_segment(window[0], window[1], workerPrimes))
+
+
+# Number of windows per worker that are queued or sieved at the same time
+POOL_WINDOWS_PER_WORKER = 4
+
+# Max. time in seconds to wait for a window, waiting with a timeout keeps the pool interruptible by CTRL+C
+POOL_TIMEOUT = 86400
+
+
+# Create a pool of workers processes, each with its own copy of the base primes
+def create_pool(workers, primes):
+    return mp.Pool(workers, initializer=init_worker, initargs=(primes,))
+
+
+# Run a task for each window in the pool, yield the results in order of the windows.
+# Only a few windows per worker are in flight, so results of fast workers don't
+# pile up in memory while the caller is still busy with earlier ones.
+def pool_results(pool, workers, task, windows):
+    pending = collections.deque()
+    try:
+        for window in windows:
+            pending.append(pool.apply_async(task, (window,)))
+            if len(pending) >= workers * POOL_WINDOWS_PER_WORKER:
+                yield pending.popleft().get(POOL_TIMEOUT)
+        while len(pending) > 0:
+            yield pending.popleft().get(POOL_TIMEOUT)
+    finally:
+        # Windows still in flight are finished quickly, terminate() can hang on Python 2
+        pool.close()
+        pool.join()
+
+
+def segmented_sieve(limit, segmentSize=None, workers=1, start=0):
+    '''Prime number generator. Yields the same series as sieve_of_eratosthenes(),
+    but sieves segment by segment, so memory use only grows with sqrt(limit).
+    With more than one worker, segments are sieved by a process pool and
+    yielded in order. With start > 0, only the primes start <= n < limit are
+    yielded, the numbers below start aren't sieved at all.
+    '''
+    primes = base_primes(limit)
+    segmentSize = segmentSize or segment_size(limit)
+    if workers <= 1:
+        for low, high in segment_windows(limit, segmentSize, start):
+            for n in segment_primes(low, high, primes):
+                yield n
+        return
+
+    pool = create_pool(workers, primes)
+    for segment in pool_results(pool, workers, segment_primes_task, segment_windows(limit, segmentSize, start)):
+        for n in segment:
+            yield n
+
+
+# Count primes start <= n < limit segment by segment, without generating them.
+# With more than one worker, segments are counted by a process pool.
+def count_primes(limit, segmentSize=None, workers=1, start=0):
+    primes = base_primes(limit)
+    segmentSize = segmentSize or segment_size(limit)
+    if workers <= 1:
+        return sum(segment_count(low, high, primes) for low, high in segment_windows(limit, segmentSize, start))
+
+    pool = create_pool(workers, primes)
+    return sum(pool_results(pool, workers, segment_count_task, segment_windows(limit, segmentSize, start)))
+
+
+#####################################
+#
+# Primality test
+#
+#####################################
+
+# With these bases, Miller-Rabin is deterministic for all n < 3.18 * 10^23,
+# which includes all 64 bit numbers
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+
+# Return True if n is prime, using the Miller-Rabin test.
+# Above 3.18 * 10^23, a composite number passes with a probability below 4^-12.
+def miller_rabin(n):
+    if n < 2:
+        return False
+    for p in MILLER_RABIN_BASES:
+        if n % p == 0:
+            return n == p
+
+    # Write n - 1 as d * 2^s with odd d
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    for a in MILLER_RABIN_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+# Return the smallest prime number > n
+def next_prime(n):
+    if n < 2:
+        return 2
+    candidate = n + 1 + n % 2
+    while not miller_rabin(candidate):
+        candidate += 2
+    return candidate
+
+
+#####################################
+#
+# Prime counting function
+#
+#####################################
+#
+# Lucy_Hedgehog's algorithm: S(v) is the number of integers 2 <= n <= v that
+# survive sieving with the primes below p. Only the values v = x // i are
+# ever needed, at most 2*sqrt(x) of them. For every prime p <= sqrt(x), the
+# multiples of p are removed from S(v) for all v >= p*p:
+#   S(v) -= S(v // p) - S(p - 1)
+# After the last prime, S(x) = pi(x). Time is O(x^(3/4)), memory O(sqrt(x)).
+#
+# small[v] holds S(v) for v <= sqrt(x), large[i] holds S(x // i) for i <= sqrt(x).
+
+# Above this, NumPy's 64 bit integers would overflow
+PRIME_PI_NUMPY_LIMIT = 2 ** 62
+
+# Up to this, the count mode cross-checks prime_pi() with the segmented sieve
+PRIME_PI_VERIFY_LIMIT = 10 ** 8
+
+
+# Optional: NumPy vectorizes the prime counting function (sudo pip install numpy)
+# Only the count mode needs it, so it's imported on first use instead of on every call.
+# Returns the numpy module if it's installed and x isn't too large for it, otherwise None.
+def prime_pi_numpy_module(x):
+    if x >= PRIME_PI_NUMPY_LIMIT:
+        return None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def prime_pi(x):
+    '''Return the number of primes <= x in O(x^(3/4)) time, without sieving
+    up to x. Uses NumPy if installed, plain Python otherwise.
+    '''
+    if x < 2:
+        return 0
+    np = prime_pi_numpy_module(x)
+    if np is not None:
+        return prime_pi_numpy(x, np)
+    return prime_pi_python(x)
+
+
+def prime_pi_python(x):
+    root = integer_sqrt(x)
+    small = [0] + [v - 1 for v in range(1, root + 1)]
+    large = [0] + [x // i - 1 for i in range(1, root + 1)]
+    for primesBelow, p in enumerate(base_primes(x + 1)):
+        square = p * p
+        end = min(root, x // square)
+        # x // (i*p) is in large while i*p <= root, in small beyond
+        middle = min(end, root // p)
+        for i in range(1, middle + 1):
+            large[i] -= large[i * p] - primesBelow
+        for i in range(middle + 1, end + 1):
+            large[i] -= small[x // (i * p)] - primesBelow
+        # Descending, so small[v // p] isn't updated for this prime yet
+        for v in range(root, square - 1, -1):
+            small[v] -= small[v // p] - primesBelow
+    return large[1]
+
+
+# Same as prime_pi_python(), but updates all values for a prime at once.
+# The right-hand sides are copies, so they still hold the values before the update.
+def prime_pi_numpy(x, np):
+    root = integer_sqrt(x)
+    small = np.arange(-1, root, dtype=np.int64)
+    small[0] = 0
+    large = np.zeros(root + 1, dtype=np.int64)
+    large[1:] = x // np.arange(1, root + 1, dtype=np.int64) - 1
+    for primesBelow, p in enumerate(base_primes(x + 1)):
+        square = p * p
+        end = min(root, x // square)
+        middle = min(end, root // p)
+        large[1:middle + 1] -= large[p:middle * p + 1:p] - primesBelow
+        if end > middle:
+            large[middle + 1:end + 1] -= small[x // (np.arange(middle + 1, end + 1, dtype=np.int64) * p)] - primesBelow
+        if square <= root:
+            small[square:] -= small[np.arange(square, root + 1, dtype=np.int64) // p] - primesBelow
+    return int(large[1])
+
+
+#####################################
+#
+# Prime cache
+#
+#####################################
+#
+# File format, all numbers little endian:
+#   8 bytes  magic 'PRIMES01'
+#   8 bytes  limit, the cache contains the sieve of all numbers below limit
+#   limit/2  bytes of sieve flags for odd numbers, byte i is 1 if 2*i+1 is prime
+#   4 bytes  number of primes per block of CACHE_BLOCKSIZE flags, for each block
+#
+# limit is always a multiple of 2 * CACHE_BLOCKSIZE, so the file can be grown
+# by appending flags and rewriting the block counts.
+
+SCRIPTPATH = os.path.dirname(os.path.abspath(os.path.join(__file__, os.pardir)))
+CACHEFILE = 'primes.cache'
+CACHE_MAGIC = b'PRIMES01'
+CACHE_HEADER = struct.Struct('<8sQ')
+CACHE_BLOCKSIZE = 64 * 1024
+CACHE_COPYSIZE = 16 * 1024 * 1024
+CACHE_BLOCKNUMBERS = 2 * CACHE_BLOCKSIZE
+
+
+# Persistent sieve with fast lookups, memory mapped from the cache file
+class PrimeCache:
+    def __init__(self, filename):
+        self.filename = filename
+        self.limit = 0
+        self.blockCounts = []
+        self.cumulative = [0]
+        self.cacheFile = None
+        self.mapped = None
+        self.open()
+
+    # Open and map the cache file, if it exists and is valid
+    def open(self):
+        try:
+            self.cacheFile = open(self.filename, 'rb')
+        except IOError:
+            return
+        header = self.cacheFile.read(CACHE_HEADER.size)
+        fileSize = os.fstat(self.cacheFile.fileno()).st_size
+        if len(header) == CACHE_HEADER.size:
+            magic, limit = CACHE_HEADER.unpack(header)
+            blockCount = limit // CACHE_BLOCKNUMBERS
+            if magic == CACHE_MAGIC and limit % CACHE_BLOCKNUMBERS == 0 and fileSize == CACHE_HEADER.size + limit // 2 + 4 * blockCount:
+                self.limit = limit
+                self.mapped = mmap.mmap(self.cacheFile.fileno(), 0, access=mmap.ACCESS_READ)
+                countsOffset = CACHE_HEADER.size + limit // 2
+                self.set_block_counts(list(struct.unpack('<' + str(blockCount) + 'I', self.mapped[countsOffset:countsOffset + 4 * blockCount])))
+                return
+        # Damaged or unfinished cache file, will be rebuilt
+        self.close()
+
+    def close(self):
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        if self.cacheFile is not None:
+            self.cacheFile.close()
+            self.cacheFile = None
+        self.limit = 0
+        self.set_block_counts([])
+
+    # Set prime counts per block and sum them up for lookups
+    def set_block_counts(self, blockCounts):
+        self.blockCounts = blockCounts
+        self.cumulative = [0]
+        for count in blockCounts:
+            self.cumulative.append(self.cumulative[-1] + count)
+
+    # Sieve the numbers between the cache's limit and the new limit and append them.
+    # Returns the new limit, which is rounded up to a multiple of CACHE_BLOCKNUMBERS.
+    def grow(self, limit, workers=1):
+        limit = (limit + CACHE_BLOCKNUMBERS - 1) // CACHE_BLOCKNUMBERS * CACHE_BLOCKNUMBERS
+        if limit <= self.limit:
+            return self.limit
+        oldLimit = self.limit
+        blockCounts = list(self.blockCounts)
+
+        primes = base_primes(limit)
+        windows = segment_windows(limit, SEGMENT_SIZE, oldLimit)
+        if workers <= 1:
+            segments = (bytes(sieve_segment(low, high, primes)) for low, high in windows)
+        else:
+            segments = pool_results(create_pool(workers, primes), workers, sieve_segment_task, windows)
+
+        # Build the grown cache in a temporary file next to the old one and rename it
+        # over the old one when complete. Other processes never see a partial file, and
+        # the ones that still map the old file keep reading it until they reopen.
+        tempName = self.filename + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(tempName, 'wb') as cacheFile:
+                cacheFile.write(CACHE_HEADER.pack(CACHE_MAGIC, limit))
+                for offset in range(0, oldLimit // 2, CACHE_COPYSIZE):
+                    cacheFile.write(self.mapped[CACHE_HEADER.size + offset:CACHE_HEADER.size + min(offset + CACHE_COPYSIZE, oldLimit // 2)])
+                for segment in segments:
+                    cacheFile.write(segment)
+                    for offset in range(0, len(segment), CACHE_BLOCKSIZE):
+                        blockCounts.append(segment[offset:offset + CACHE_BLOCKSIZE].count(b'\x01'))
+                cacheFile.write(struct.pack('<' + str(len(blockCounts)) + 'I', *blockCounts))
+            os.rename(tempName, self.filename)
+        except:
+            if os.path.exists(tempName):
+                os.remove(tempName)
+            raise
+        self.close()
+        self.open()
+        return self.limit
+
+    # Return True if n is prime, n must be below the cache's limit
+    def is_prime(self, n):
+        if n < 3:
+            return n == 2
+        if n % 2 == 0:
+            return False
+        return self.mapped[CACHE_HEADER.size + n // 2:CACHE_HEADER.size + n // 2 + 1] == b'\x01'
+
+    # Return the number of primes <= n, n must be below the cache's limit
+    def pi(self, n):
+        if n < 2:
+            return 0
+        # Flags of the odd numbers 1, 3, ... n are at index 0 up to (n - 1) // 2
+        end = (n + 1) // 2
+        block = end // CACHE_BLOCKSIZE
+        blockStart = CACHE_HEADER.size + block * CACHE_BLOCKSIZE
+        return 1 + self.cumulative[block] + self.mapped[blockStart:CACHE_HEADER.size + end].count(b'\x01')
+
+    # Return the k-th prime number (k >= 1), or None if the cache doesn't contain it
+    def nth_prime(self, k):
+        if k == 1:
+            return 2
+        # Find the block containing the (k-1)-th odd prime, then scan its flags
+        oddIndex = k - 1
+        block = bisect.bisect_left(self.cumulative, oddIndex) - 1
+        if block < 0 or block >= len(self.blockCounts):
+            return None
+        blockStart = block * CACHE_BLOCKSIZE
+        flags = bytearray(self.mapped[CACHE_HEADER.size + blockStart:CACHE_HEADER.size + blockStart + CACHE_BLOCKSIZE])
+        index = next(itertools.islice(itertools.compress(range(len(flags)), flags), oddIndex - self.cumulative[block] - 1, None))
+        return 2 * (blockStart + index) + 1
+
+    # Yield all primes below limit, limit must not exceed the cache's limit
+    def primes(self, limit):
+        if limit > 2:
+            yield 2
+        for blockStart in range(0, limit // 2, CACHE_BLOCKSIZE):
+            blockEnd = min(blockStart + CACHE_BLOCKSIZE, limit // 2)
+            flags = bytearray(self.mapped[CACHE_HEADER.size + blockStart:CACHE_HEADER.size + blockEnd])
+            for n in itertools.compress(range(2 * blockStart + 1, 2 * blockEnd + 1, 2), flags):
+                yield n
+
+
+# Return an upper bound for the k-th prime number (Rosser's theorem)
+def nth_prime_bound(k):
+    if k < 6:
+        return 15
+    return int(k * (math.log(k) + math.log(math.log(k)))) + 1
+
+
+# Open the prime cache and grow it to contain all numbers below limit
+def open_cache(log, filename, limit, workers=1):
+    cache = PrimeCache(filename)
+    if cache.limit > 0:
+        log.info('Prime cache ' + filename + ' contains numbers up to ' + '{:,}'.format(cache.limit))
+    if limit > cache.limit:
+        oldLimit = cache.limit
+        timeStart = time.time()
+        cache.grow(limit, workers)
+        log.info('Grew prime cache from ' + '{:,}'.format(oldLimit) + ' to ' + '{:,}'.format(cache.limit) + ' in ' + '{:.3f}'.format(time.time() - timeStart) + ' sec')
+    return cache
+
+
+# Answer a query about number with the prime cache
+def cache_query(cache, mode, number, workers=1):
+    if mode == 'isprime':
+        return cache.is_prime(number)
+    if mode == 'pi':
+        return cache.pi(number)
+    if mode == 'nth':
+        if number > cache.pi(cache.limit - 1):
+            cache.grow(nth_prime_bound(number), workers)
+        return cache.nth_prime(number)
 
 
 #####################################
@@ -74,11 +638,32 @@ def sieve_of_eratosthenes(limit):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
+
+
+# Queries about a number, the numbers are passed as additional arguments
+primeModes = ['isprime', 'nextprime', 'range', 'pi', 'nth', 'count']
+
+
+# Max. B of range queries. The base primes up to sqrt(B) are kept in a list,
+# beyond 10^16 (5.8 million primes) it takes minutes and gigabytes to build
+# it. This also keeps B below 2^63, the limit of xrange() in Python 2.
+RANGE_MAX = 10 ** 16
+
+
+# Max. limit of the prime cache. The cache keeps one byte per odd number,
+# 10^9 numbers take a 500 MB file. Larger pi queries are answered by count.
+CACHE_MAX = 10 ** 9
+
+
+# Return the numeric arguments, these are the numbers of a query
+def number_args(args):
+    return [int(arg) for arg in args if arg.isdigit()]
 
 
 # Add command line arguments for this script to args parser
 def setup_args(optGroup):
-    optGroup.add_option('--primenumbers', type='int', dest='primenumbers', default=None, help='Perform prime number test up to LIMIT', metavar='LIMIT')
+    optGroup.add_option('--primenumbers', type='string', dest='primenumbers', default=None, help='Perform prime number test up to LIMIT, or answer a query about a number. Possible queries: ' + str(primeModes) + '.', metavar='LIMIT')
 
 
 # Return True if args/options tell us to run this module
@@ -88,8 +673,39 @@ def check_options(log, options, args):
 
 # Checks additional arguments and prints error messages
 def check_additional_options(log, options, args):
-    if options.primenumbers <= 2:
-        log.error('LIMIT must be > 2')
+    mode = options.primenumbers.lower()
+    if mode.isdigit():
+        if int(mode) <= 2:
+            log.error('LIMIT must be > 2')
+            return False
+        useCache = any(arg.upper() == 'CACHE' or (arg.upper()[:9] == 'CACHEFILE' and '=' in arg) for arg in args)
+        if useCache and int(mode) > CACHE_MAX:
+            log.error('LIMIT must be <= ' + '{:,}'.format(CACHE_MAX) + ' to use the prime cache')
+            return False
+        return True
+    if mode not in primeModes:
+        log.error('LIMIT must be a number or one of the following queries: ' + str(primeModes))
+        return False
+    numbers = number_args(args)
+    if mode == 'range':
+        if len(numbers) != 2 or numbers[0] > numbers[1]:
+            log.error('Query range needs two numbers A <= B')
+            return False
+        if numbers[1] > RANGE_MAX:
+            log.error('B must be <= ' + '{:,}'.format(RANGE_MAX) + ', use isprime or nextprime for larger numbers')
+            return False
+        return True
+    if len(numbers) != 1:
+        log.error('Query ' + mode + ' needs one number')
+        return False
+    if mode == 'nth' and numbers[0] < 1:
+        log.error('K must be >= 1')
+        return False
+    if mode == 'pi' and numbers[0] >= CACHE_MAX:
+        log.error('N must be < ' + '{:,}'.format(CACHE_MAX) + ', use count for larger numbers')
+        return False
+    if mode == 'nth' and nth_prime_bound(numbers[0]) > CACHE_MAX:
+        log.error('K is too large, the nth prime must be found below ' + '{:,}'.format(CACHE_MAX) + ' in the prime cache')
         return False
     return True
 
@@ -107,27 +723,132 @@ def get_info():
 # Calculate prime numbers op to limit
 def run(log, options, args):
     # Get arguments
-    limit = options.primenumbers
+    mode = options.primenumbers.lower()
     printPrimes = False
+    workers = 1
+    useCache = False
+    cacheFile = os.path.join(SCRIPTPATH, CACHEFILE)
 
     # Parse args
-    for arg in args:
-        arg = arg.upper()
+    for originalArg in args:
+        arg = originalArg.upper()
         if arg == 'HELP':
             print(SCRIPT_HELP)
         elif arg == 'PRINT':
             printPrimes = True
+        elif arg[:7] == 'WORKERS' and '=' in arg:
+            workers = int(arg.split('=')[1])
+            if workers < 1:
+                workers = mp.cpu_count()
+        elif arg == 'CACHE':
+            useCache = True
+        elif arg[:9] == 'CACHEFILE' and '=' in arg:
+            cacheFile = originalArg.split('=', 1)[1]
+            useCache = True
+        elif arg.isdigit():
+            pass
         else:
             log.error('Unsupported argument: ' + arg)
             print('')
 
     # Welcome
     log.info(get_name())
+
+    # Range queries sieve only the window A <= n <= B, with the base primes up to sqrt(B)
+    if mode == 'range':
+        low, high = number_args(args)
+        log.info('Sieving prime numbers from ' + '{:,}'.format(low) + ' to ' + '{:,}'.format(high) + '...')
+        timeStart = time.time()
+        if printPrimes:
+            primeNumbers = list(segmented_sieve(high + 1, workers=workers, start=low))
+            primeCount = len(primeNumbers)
+        else:
+            primeCount = count_primes(high + 1, workers=workers, start=low)
+        timePassed = time.time() - timeStart
+        if printPrimes:
+            print(' ')
+            print('Prime numbers:')
+            print(str(primeNumbers))
+            print(' ')
+        log.info('Found ' + '{:,}'.format(primeCount) + ' prime numbers!!!')
+        log.info('Finished in ' + str(timePassed * 1000) + ' msec')
+        result = {'mode': mode, 'low': low, 'high': high, 'count': primeCount, 'seconds': timePassed, 'workers': workers}
+        if printPrimes:
+            result['primes'] = primeNumbers
+        return result
+
+    # count doesn't sieve up to N, but small counts are cross-checked with the sieve
+    if mode == 'count':
+        number = number_args(args)[0]
+        log.info('Counting prime numbers <= ' + '{:,}'.format(number) + (' with NumPy' if prime_pi_numpy_module(number) is not None else '') + '...')
+        timeStart = time.time()
+        primeCount = prime_pi(number)
+        timePassed = time.time() - timeStart
+        log.info('Found ' + '{:,}'.format(primeCount) + ' prime numbers!!!')
+        log.info('Finished in ' + str(timePassed * 1000) + ' msec')
+        result = {'mode': mode, 'number': number, 'count': primeCount, 'seconds': timePassed}
+        if number <= PRIME_PI_VERIFY_LIMIT:
+            sieveCount = count_primes(number + 1, workers=workers)
+            result['verified'] = sieveCount == primeCount
+            if result['verified']:
+                log.info('Cross-check with the sieve: OK')
+            else:
+                log.error('Cross-check with the sieve failed, the sieve found ' + '{:,}'.format(sieveCount) + ' prime numbers')
+        return result
+
+    # isprime uses the prime cache as far as it goes, like nextprime it
+    # falls back to Miller-Rabin beyond. pi and nth grow the prime cache.
+    if mode in primeModes:
+        number = number_args(args)[0]
+        timeStart = time.time()
+        if mode == 'isprime':
+            cache = PrimeCache(cacheFile)
+        elif mode != 'nextprime':
+            cache = open_cache(log, cacheFile, nth_prime_bound(number) if mode == 'nth' else number + 1, workers)
+        if mode == 'nextprime':
+            method = 'miller-rabin'
+            answer = next_prime(number)
+        elif mode == 'isprime' and number >= cache.limit:
+            method = 'miller-rabin'
+            answer = miller_rabin(number)
+        else:
+            method = 'cache'
+            answer = cache_query(cache, mode, number, workers)
+        timePassed = time.time() - timeStart
+        if mode != 'nextprime':
+            cache.close()
+        if mode == 'isprime':
+            log.info('{:,}'.format(number) + (' is prime' if answer else ' is not prime'))
+        elif mode == 'nextprime':
+            log.info('The next prime number after ' + '{:,}'.format(number) + ' is ' + '{:,}'.format(answer))
+        elif mode == 'pi':
+            log.info('There are ' + '{:,}'.format(answer) + ' prime numbers <= ' + '{:,}'.format(number))
+        else:
+            log.info('Prime number #' + '{:,}'.format(number) + ' is ' + '{:,}'.format(answer))
+        log.info('Finished in ' + str(timePassed * 1000) + ' msec')
+        return {'mode': mode, 'number': number, 'answer': answer, 'seconds': timePassed, 'method': method}
+
+    limit = int(mode)
     log.info('Calculating prime numbers up to ' + '{:,}'.format(limit) + '...')
+    if workers > 1:
+        log.info('Sieving segments with ' + str(workers) + ' processes')
 
     # Perform sieve and measure time
+    # Only keep the prime numbers if they should be printed, counting needs no memory
     timeStart = time.time()
-    primeNumbers = list(sieve_of_eratosthenes(limit))
+    if useCache:
+        cache = open_cache(log, cacheFile, limit, workers)
+        if printPrimes:
+            primeNumbers = list(cache.primes(limit))
+            primeCount = len(primeNumbers)
+        else:
+            primeCount = cache.pi(limit - 1)
+        cache.close()
+    elif printPrimes:
+        primeNumbers = list(segmented_sieve(limit, workers=workers))
+        primeCount = len(primeNumbers)
+    else:
+        primeCount = count_primes(limit, workers=workers)
     timePassed = time.time() - timeStart
 
     # Print prime numbers
@@ -138,8 +859,13 @@ def run(log, options, args):
         print(' ')
 
     # Diagnostic information
-    log.info('Found ' + '{:,}'.format(len(primeNumbers)) + ' prime numbers!!!')
+    log.info('Found ' + '{:,}'.format(primeCount) + ' prime numbers!!!')
     if timePassed > 1.5:
         log.info('Finished in ' + str(timePassed) + ' sec')
     else:
         log.info('Finished in ' + str(timePassed * 1000) + ' msec')
+
+    result = {'limit': limit, 'count': primeCount, 'seconds': timePassed, 'workers': workers}
+    if printPrimes:
+        result['primes'] = primeNumbers
+    return result
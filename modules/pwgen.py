@@ -92,6 +92,7 @@ def gibberish(wordcount, wordlist=syllables):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -144,5 +145,8 @@ def run(log, options, args):
       pwLen = random.randrange(3, 5)
 
     # Generate word
-    log.info(gibberish(pwLen).title())
+    password = gibberish(pwLen).title()
+    log.info(password)
+
+    return {'password': password}
     
\ No newline at end of file
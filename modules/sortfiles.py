@@ -150,6 +150,7 @@ def iterate_files(log, sourceFolder, targetFolder, filePattern, dryRun):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -254,3 +255,5 @@ def run(log, options, args):
             log.error(errorString)
     else:
         log.info('No errors occurred.')
+
+    return {'files': fileCount, 'folders': folderList, 'errors': errorList, 'dryrun': dryRun}
@@ -161,6 +161,7 @@ def speak(engine, text):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -227,3 +228,5 @@ def run(log, options, args):
 
     # Speak
     speak(ttsEngine, text.decode('utf-8'))
+
+    return {'text': text}
@@ -593,6 +593,7 @@ def print_highscores(log, highscores):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -631,3 +632,4 @@ def run(log, options, args):
             sys.exit()
 
     run_tictactoe(log, args)
+    return None
@@ -130,6 +130,7 @@ def print_waveform_line(i, param1, param2, param3):
 # run(log, options)
 #    Main function where all the magic's happening.
 #    logger object and command line options dictionary are passed
+#    Return a dictionary with the results (printed by the launcher in --json mode), or None
 
 
 # Add command line arguments for this script to args parser
@@ -217,3 +218,5 @@ def run(log, options, args):
         timeUsed = (time.time() - startTime)
         log.info('Finished! Been running for ' + ('%.3f' % timeUsed) + ' seconds and calculated ' + '{:,}'.format(lineCounter) + ' steps!')
         log.info('Pure calculation time: ' + ('%.3f' % timeUsedPure) + ' seconds')
+
+        return {'steps': lineCounter, 'seconds': timeUsed, 'calculationseconds': timeUsedPure}
@@ -1,8 +1,15 @@
 #!/usr/bin/python
+import os
+import sys
+import json
+import struct
+import timeit
 import optparse
 import logging
-import pkgutil
-import importlib
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 
 # Script info
@@ -20,25 +27,215 @@ LOGFILEFORMAT = '%(asctime)s: %(levelname)s: %(message)s'
 log = logging.getLogger('log')
 
 
-# Import modules from "modules" package folder
+# Server mode
+# The socket is kept in a directory that only the user can write to, so other
+# users can't replace it with their own server. Responses are sent as messages
+# with a type byte and a number: 'o' is followed by that many bytes of output,
+# 'x' ends the response with the exit status.
+def SocketDirectory():
+    runtimeDir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtimeDir and os.path.isdir(runtimeDir):
+        return runtimeDir
+    return '/tmp/python-tests-launcher-' + str(os.getuid())
+
+SOCKETFILE = os.path.join(SocketDirectory(), 'python-tests-launcher.sock')
+MESSAGEHEADER = struct.Struct('!ci')
+
+
+# Startup profiling
+# Timings in seconds, filled while the launcher starts up
+startupTimes = {}
+importTimes = {}
+
+# Register modules from "modules" package folder
+# Option specs, names and info strings are read from the manifest cache,
+# modules are only imported when they are actually needed. Entries are
+# invalidated by module file size and checksum. An outdated cache entry is
+# replaced by the static manifest's entry if that is up to date, otherwise
+# the module is imported. If a changed module can't be imported, or the
+# cache can't be written and the import would be repeated on every call,
+# the static manifest's entry is used anyway.
 registeredModules = []
-def ImportModules(log):
+def RegisterModules(log):
     import modules
-    log.debug('Loading ' + str(len(modules.__all__)) + ' modules...')
+    log.debug('Registering ' + str(len(modules.__all__)) + ' modules...')
     if len(modules.excludedModules) > 0:
         log.debug('Excluded modules: ' + str(modules.excludedModules))
+    cache = modules.load_manifest(modules.MANIFESTCACHEFILE)
+    cacheWritable = modules.manifest_cache_writable()
+    manifest = None
+    cacheChanged = False
+    for m in modules.__all__:
+        stamp = modules.module_stamp(m)
+        entry = cache.get(m)
+        if entry is None or entry.get('stamp') != stamp:
+            log.debug('Manifest cache entry for module ' + m + ' is outdated')
+            if manifest is None:
+                manifest = modules.load_manifest()
+            entry = manifest.get(m)
+            if entry is None or (entry.get('stamp') != stamp and cacheWritable):
+                module = ImportModule(log, m)
+                if module is not None:
+                    entry = modules.build_manifest_entry(module)
+            if entry is None:
+                continue
+            entry = dict(entry)
+            entry['stamp'] = stamp
+            cache[m] = entry
+            cacheChanged = True
+        entry['module'] = m
+        entry['dests'] = []
+        registeredModules.append(entry)
+        log.debug('Registered module ' + m)
+
+    # Write updated cache, drop entries of removed modules
+    for m in list(cache.keys()):
+        if m not in modules.__all__:
+            del cache[m]
+            cacheChanged = True
+    if cacheChanged and cacheWritable:
+        WriteManifestCache(log, cache)
+
+
+# Write manifest cache to disk, without the launcher's runtime fields
+def WriteManifestCache(log, cache):
+    import modules
+    cleanCache = {}
+    for m, entry in cache.items():
+        cleanCache[m] = dict((key, value) for key, value in entry.items() if key not in ('module', 'dests'))
+    try:
+        modules.write_manifest(cleanCache, modules.MANIFESTCACHEFILE)
+        log.debug('Wrote manifest cache to ' + modules.MANIFESTCACHEFILE)
+    except (IOError, OSError):
+        log.debug('Could not write manifest cache to ' + modules.MANIFESTCACHEFILE)
+
+
+# Import a module from "modules" package folder
+def ImportModule(log, moduleName):
+    import modules
+    try:
+        timeStart = timeit.default_timer()
+        module = modules.load_module(moduleName)
+        importTimes.setdefault(moduleName, timeit.default_timer() - timeStart)
+        log.debug('Imported module ' + moduleName)
+        return module
+    except:
+        log.error('Could not import module ' + moduleName + '!')
+        return None
+
+
+# Import all modules and write a fresh module manifest
+def UpdateManifest(log):
+    import modules
+    manifest = modules.load_manifest()
     for m in modules.__all__:
+        module = ImportModule(log, m)
+        if module is not None:
+            manifest[m] = modules.build_manifest_entry(module)
+            manifest[m]['stamp'] = modules.module_stamp(m)
+        elif m in manifest:
+            # Stamp it anyway, otherwise every fresh checkout would try to import the module
+            log.warning('Keeping previous manifest entry for module ' + m)
+            manifest[m]['stamp'] = modules.module_stamp(m)
+    for m in list(manifest.keys()):
+        if m not in modules.__all__:
+            del manifest[m]
+    modules.write_manifest(manifest)
+    log.info('Wrote manifest for ' + str(len(manifest)) + ' modules to ' + modules.MANIFESTFILE)
+
+
+# Import all modules and measure import and setup_args() cost
+def ProfileStartup(log, options):
+    import modules
+    results = []
+    for entry in registeredModules:
+        m = entry['module']
+        result = {'module': m, 'import': None, 'setup_args': None, 'total': 0.0}
+        module = ImportModule(log, m)
+        if module is not None:
+            result['import'] = importTimes.get(m, 0.0)
+            scratchParser = optparse.OptionParser()
+            optGroup = optparse.OptionGroup(scratchParser, entry['name'], entry['info'])
+            timeStart = timeit.default_timer()
+            module.setup_args(optGroup)
+            result['setup_args'] = timeit.default_timer() - timeStart
+            result['total'] = result['import'] + result['setup_args']
+        results.append(result)
+    results.sort(key=lambda result: result['total'], reverse=True)
+
+    # Print table, slowest modules first
+    def format_msec(value):
+        if value is None:
+            return '{:>12}'.format('FAILED')
+        return '{:12.3f}'.format(value * 1000.0)
+
+    log.info('Startup profile (times in msec):')
+    print('')
+    log.info('{:20}'.format('MODULE') + '{:>12}'.format('IMPORT') + '{:>12}'.format('SETUP_ARGS') + '{:>12}'.format('TOTAL'))
+    log.info('=' * 56)
+    for result in results:
+        log.info('{:20}'.format(result['module']) + format_msec(result['import']) + format_msec(result['setup_args']) + format_msec(result['total']))
+    log.info('=' * 56)
+    for phase in ('register', 'parser', 'parse'):
+        log.info('{:44}'.format('Launcher: ' + phase) + format_msec(startupTimes.get(phase, 0.0)))
+    log.info('{:44}'.format('Launcher: total') + format_msec(sum(startupTimes.values())))
+
+    # Write JSON report
+    if options.profilejson:
+        report = {'modules': results, 'launcher': startupTimes}
         try:
-            registeredModules.append(importlib.import_module(m))
-            log.debug('Imported module ' + m)
-        except:
-            log.error('Could not import module ' + m + '!')
+            with open(options.profilejson, 'w') as reportFile:
+                reportFile.write(json.dumps(report, indent=4, sort_keys=True, separators=(',', ': ')))
+            log.info('Wrote startup profile to ' + options.profilejson)
+        except IOError:
+            log.error('Could not write startup profile to ' + options.profilejson)
+
+
+# Return True if any of the module's options has been set on the command line
+def ModuleRequested(entry, options):
+    for dest in entry['dests']:
+        if getattr(options, dest, None) is not None:
+            return True
+    return False
+
+
+# Return the exit status if no module has been run: 2 like for invalid
+# options if a module's options have been set but were rejected, otherwise 0
+def NoModuleStatus(options):
+    for entry in registeredModules:
+        if ModuleRequested(entry, options):
+            return 2
+    return 0
 
 
 # Set up command line argument options for main script
 def SetupOptions(parser):
     parser.add_option('-l', '--listmodules', action='store_true', dest='listmodules', default=False, help='List registered test modules')
     parser.add_option('-f', '--logfile', action='store_true', dest='logfile', default=False, help='Create log file')
+    parser.add_option('--json', action='store_true', dest='json', default=False, help='Suppress screen output and print the module\'s results as JSON')
+    parser.add_option('--updatemanifest', action='store_true', dest='updatemanifest', default=False, help='Import all modules and rewrite the module manifest')
+    parser.add_option('--profile-startup', action='store_true', dest='profilestartup', default=False, help='Measure import and setup time of all modules and of the launcher itself')
+    parser.add_option('--profile-json', type='string', dest='profilejson', default=None, help='Also write the startup profile to a JSON FILE', metavar='FILE')
+    parser.add_option('--serve', action='store_true', dest='serve', default=False, help='Keep all modules loaded and serve requests from client.py over a local socket')
+    parser.add_option('--batch', type='string', dest='batch', default=None, help='Run one command line per row from FILE (use "-" for stdin) and write results as JSON lines', metavar='FILE')
+    parser.add_option('--batch-out', type='string', dest='batchout', default=None, help='Write batch results to FILE instead of stdout', metavar='FILE')
+    parser.add_option('--jobs', type='int', dest='jobs', default=1, help='Number of worker processes for --batch, output order is preserved (default: 1)', metavar='N')
+    parser.add_option('--socket', type='string', dest='socket', default=SOCKETFILE, help='Socket FILE for --serve (default: ' + SOCKETFILE + ')', metavar='FILE')
+
+
+# Build args parser with options for main script and all registered modules
+def BuildParser():
+    parser = optparse.OptionParser(SCRIPTUSAGE)
+    SetupOptions(parser)
+    for entry in registeredModules:
+        log.debug(entry['module'])
+        optGroup = optparse.OptionGroup(parser, entry['name'], entry['info'])
+        entry['dests'] = []
+        for optionSpec in entry['options']:
+            option = optGroup.add_option(*optionSpec['args'], **optionSpec['kwargs'])
+            entry['dests'].append(option.dest)
+        parser.add_option_group(optGroup)
+    return parser
 
 
 # Parse provided command line arguments
@@ -67,8 +264,263 @@ def SetupFileLogging():
     log.addHandler(logFileHandler)
 
 
-def main():
-    # Title
+# List registered modules
+def ListModules(log):
+    log.info('Listing ' + str(len(registeredModules)) + ' registered tool modules:')
+    print('')
+    for entry in registeredModules:
+        log.info(entry['name'])
+        log.info('        ' + entry['info'])
+        print('')
+
+
+# Run the module whose options have been set, only import the ones needed
+# Returns {'module': name, 'result': result} if a module has been run, otherwise None
+def RunModules(log, options, args):
+    for entry in registeredModules:
+        if not ModuleRequested(entry, options):
+            continue
+        m = ImportModule(log, entry['module'])
+        if m is None:
+            continue
+        if m.check_options(options=options, args=args, log=log):
+            if m.check_additional_options(options=options, args=args, log=log):
+                result = m.run(options=options, args=args, log=log)
+                return {'module': entry['module'], 'result': result}
+    return None
+
+
+# Run the module whose options have been set, with all screen output and
+# info logging suppressed. Warnings and errors are still logged.
+def RunModulesQuiet(log, options, args):
+    with QuietOutput():
+        return RunModules(log, options, args)
+
+
+# Serialize a RunModules() record for --json mode
+def FormatJson(record):
+    return json.dumps(record, sort_keys=True, default=str)
+
+
+# Run a single command line as if it was passed to the launcher
+# Modules may call sys.exit(), which only ends this command line.
+# If quiet is True, module output is suppressed like in --json mode.
+# Returns the RunModules() record or None, and the exit status
+def RunCommandLine(log, parser, argv, quiet=False):
+    record = None
+    status = 0
+    try:
+        options, args = parser.parse_args(argv)
+        if options.listmodules:
+            ListModules(log)
+        elif options.json:
+            record = RunModulesQuiet(log, options, args)
+            print(FormatJson(record))
+        elif quiet:
+            record = RunModulesQuiet(log, options, args)
+        else:
+            record = RunModules(log, options, args)
+            if record is None:
+                parser.print_help()
+        if record is None and not options.listmodules:
+            status = NoModuleStatus(options)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            status = e.code or 0
+        else:
+            status = 1
+    except Exception as e:
+        log.error('Command line ' + str(argv) + ' failed: ' + str(e))
+        status = 1
+    return record, status
+
+
+# Suppress screen output and info logging of modules
+class QuietOutput:
+    def __enter__(self):
+        self.savedStdout = sys.stdout
+        self.savedLevel = log.level
+        sys.stdout = open(os.devnull, 'w')
+        log.setLevel(logging.WARNING)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        sys.stdout.close()
+        sys.stdout = self.savedStdout
+        log.setLevel(self.savedLevel)
+        return False
+
+
+# File-like object that sends everything written to it over a socket, as output messages
+class SocketWriter:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        if len(data) > 0:
+            self.connection.sendall(MESSAGEHEADER.pack(b'o', len(data)) + data)
+
+    def flush(self):
+        pass
+
+
+# Redirect stdout, stderr and log output of main script and modules to a stream
+class OutputRedirect:
+    def __init__(self, stream):
+        self.stream = stream
+        self.handler = logging.StreamHandler(stream)
+        self.handler.setLevel(LOGLEVEL)
+        self.handler.setFormatter(logging.Formatter(LOGFORMAT))
+
+    def __enter__(self):
+        self.savedStreams = (sys.stdin, sys.stdout, sys.stderr)
+        self.savedHandlers = log.handlers[:]
+        sys.stdin = open(os.devnull, 'r')
+        sys.stdout = sys.stderr = self.stream
+        log.handlers = [handler for handler in self.savedHandlers if isinstance(handler, logging.FileHandler)] + [self.handler]
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        sys.stdin.close()
+        sys.stdin, sys.stdout, sys.stderr = self.savedStreams
+        log.handlers = self.savedHandlers
+        return False
+
+
+# Run one batch row with captured output, return JSON result line
+# In --json mode, only the module's result is returned, without output.
+# Rows that couldn't be split into a command line only return their error.
+# Parser is module global, so pool workers inherit it instead of pickling it
+batchParser = None
+batchJson = False
+def RunBatchRow(row):
+    rowIndex, argv, error = row
+    if error is not None:
+        return FormatJson({'row': rowIndex, 'error': error})
+    output = StringIO()
+    with OutputRedirect(output):
+        record, status = RunCommandLine(log, batchParser, argv, quiet=batchJson)
+    resultLine = {'row': rowIndex, 'argv': argv, 'status': status}
+    if record is not None:
+        resultLine.update(record)
+    if not batchJson:
+        resultLine['output'] = output.getvalue()
+    return FormatJson(resultLine)
+
+
+# Run many command lines from one process, one command line per row.
+# Empty rows and rows starting with "#" are skipped.
+def RunBatch(log, parser, options):
+    import shlex
+    import multiprocessing
+    global batchParser, batchJson
+    batchParser = parser
+    batchJson = options.json
+
+    try:
+        if options.batch == '-':
+            lines = sys.stdin.readlines()
+        else:
+            with open(options.batch, 'r') as batchFile:
+                lines = batchFile.readlines()
+    except IOError:
+        log.error('Could not read batch file ' + options.batch)
+        return
+    rows = []
+    for rowIndex, line in enumerate(lines):
+        line = line.strip()
+        if line == '' or line[0] == '#':
+            continue
+        try:
+            rows.append((rowIndex + 1, shlex.split(line), None))
+        except ValueError as e:
+            log.error('Could not parse row ' + str(rowIndex + 1) + ': ' + str(e))
+            rows.append((rowIndex + 1, None, str(e)))
+    log.info('Running ' + str(len(rows)) + ' command lines with ' + str(max(options.jobs, 1)) + ' job(s)...')
+
+    if options.batchout:
+        out = open(options.batchout, 'w')
+    else:
+        out = sys.stdout
+    try:
+        if options.jobs > 1:
+            pool = multiprocessing.Pool(options.jobs)
+            try:
+                for resultLine in pool.imap(RunBatchRow, rows, chunksize=64):
+                    out.write(resultLine + '\n')
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for row in rows:
+                out.write(RunBatchRow(row) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if options.batchout:
+        log.info('Wrote batch results to ' + options.batchout)
+
+
+# Return True if only the user can create or replace files in directory
+def SocketDirectoryTrusted(directory):
+    try:
+        directoryStat = os.lstat(directory)
+    except OSError:
+        return False
+    return os.path.isdir(directory) and not os.path.islink(directory) and directoryStat.st_uid == os.getuid() and directoryStat.st_mode & 0o022 == 0
+
+
+# Keep all modules loaded and run command lines sent by client.py
+# Each request is a JSON line {"argv": [...], "cwd": "..."}, output is
+# streamed back as messages, followed by the exit status.
+def Serve(log, parser, socketFile):
+    import socket
+
+    # Create the default socket directory, other directories must already exist
+    socketDir = os.path.dirname(os.path.abspath(socketFile))
+    if socketDir == SocketDirectory() and not os.path.lexists(socketDir):
+        os.mkdir(socketDir, 0o700)
+    if not SocketDirectoryTrusted(socketDir):
+        log.error('Socket directory ' + socketDir + ' must be owned by you and must not be writable by others')
+        return
+
+    for entry in registeredModules:
+        ImportModule(log, entry['module'])
+
+    if os.path.lexists(socketFile):
+        os.remove(socketFile)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socketFile)
+    os.chmod(socketFile, 0o600)
+    server.listen(5)
+    log.info('Serving on ' + socketFile + ', press CTRL+C to stop')
+
+    scriptCwd = os.getcwd()
+    try:
+        while True:
+            connection, address = server.accept()
+            try:
+                request = json.loads(connection.makefile('r').readline())
+                argv = [arg if isinstance(arg, str) else arg.encode('utf-8') for arg in request.get('argv', [])]
+                log.debug('Request: ' + str(argv))
+                os.chdir(request.get('cwd', scriptCwd))
+                with OutputRedirect(SocketWriter(connection)):
+                    record, status = RunCommandLine(log, parser, argv)
+                connection.sendall(MESSAGEHEADER.pack(b'x', status))
+            except (ValueError, socket.error, OSError) as e:
+                log.error('Could not handle request: ' + str(e))
+            finally:
+                os.chdir(scriptCwd)
+                connection.close()
+    finally:
+        server.close()
+        os.remove(socketFile)
+
+
+# Print script title
+def PrintTitle():
     print('+-----------------------------')
     print('| ' + SCRIPTTITLE + ' ' + SCRIPTVERSION)
     print('|')
@@ -76,21 +528,33 @@ def main():
     print('+-----------------------------')
     print(' ')
 
+
+# False if stdout has to stay machine-readable
+screenOutput = True
+
+def main():
     # Setup logger and modules
     SetupLogging()
 
-    # Import modules
-    ImportModules(log)
+    # Register modules
+    timeStart = timeit.default_timer()
+    RegisterModules(log)
+    startupTimes['register'] = timeit.default_timer() - timeStart
 
     # Setup args for all modules, then parse
-    parser = optparse.OptionParser(SCRIPTUSAGE)
-    SetupOptions(parser)
-    for module in registeredModules:
-        log.debug(str(module))
-        optGroup = optparse.OptionGroup(parser, module.get_name(), module.get_info())
-        module.setup_args(optGroup)
-        parser.add_option_group(optGroup)
+    timeStart = timeit.default_timer()
+    parser = BuildParser()
+    startupTimes['parser'] = timeit.default_timer() - timeStart
+    timeStart = timeit.default_timer()
     options, args = ParseOptions(parser)
+    startupTimes['parse'] = timeit.default_timer() - timeStart
+
+    # Title and blank lines, not in --json and --batch mode so the output stays machine-readable
+    global screenOutput
+    screenOutput = not options.json and not options.batch
+    if screenOutput:
+        print('')
+        PrintTitle()
 
     # Create log file
     if options.logfile:
@@ -98,31 +562,54 @@ def main():
     log.debug('options: ' + str(options))
     log.debug('args   : ' + str(args))
 
+    # Rewrite module manifest
+    if options.updatemanifest:
+        UpdateManifest(log)
+        return
+
+    # Profile startup
+    if options.profilestartup:
+        ProfileStartup(log, options)
+        return
+
+    # Run batch file
+    if options.batch:
+        RunBatch(log, parser, options)
+        return
+
+    # Serve requests
+    if options.serve:
+        Serve(log, parser, options.socket)
+        return
+
     # List modules
     if options.listmodules is not None and options.listmodules == True:
-        log.info('Listing ' + str(len(registeredModules)) + ' registered tool modules:')
-        print('')
-        for m in registeredModules:
-            log.info(m.get_name())
-            log.info('        ' + m.get_info())
-            print('')
+        ListModules(log)
+        return
+
+    # Run modules and print results as JSON
+    if options.json:
+        record = RunModulesQuiet(log, options, args)
+        print(FormatJson(record))
+        if record is None:
+            return NoModuleStatus(options)
         return
 
     # Run modules
-    for m in registeredModules:
-        if m.check_options(options=options, args=args, log=log):
-            if m.check_additional_options(options=options, args=args, log=log):
-                m.run(options=options, args=args, log=log)
-                return
+    if RunModules(log, options, args) is not None:
+        return
 
     # If no module was used, print help
     parser.print_help()
+    return NoModuleStatus(options)
 
 # Kick off the shit...
 if __name__=='__main__':
     try:
-        print ''
-        main()
-        print ''
+        status = main()
+        if screenOutput:
+            print('')
+        if status:
+            sys.exit(status)
     except KeyboardInterrupt:
         log.error('Cancelled')